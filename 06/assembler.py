@@ -1,4 +1,131 @@
-import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+from pathlib import Path
+from typing import Iterable, Iterator
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+# Computation field (a-bit included) for the canonical Hack mnemonics, written with A as operand
+BASE_COMP = {
+    '0': 0b0101010,
+    '1': 0b0111111,
+    '-1': 0b0111010,
+    'D': 0b0001100,
+    'A': 0b0110000,
+    '!D': 0b0001101,
+    '!A': 0b0110001,
+    '-D': 0b0001111,
+    '-A': 0b0110011,
+    'D+1': 0b0011111,
+    'A+1': 0b0110111,
+    'D-1': 0b0001110,
+    'A-1': 0b0110010,
+    'D+A': 0b0000010,
+    'D-A': 0b0010011,
+    'A-D': 0b0000111,
+    'D&A': 0b0000000,
+    'D|A': 0b0010101,
+}
+JUMP = {
+    '': 0b000,
+    'JGT': 0b001,
+    'JEQ': 0b010,
+    'JGE': 0b011,
+    'JLT': 0b100,
+    'JNE': 0b101,
+    'JLE': 0b110,
+    'JMP': 0b111,
+}
+
+def buildCompTable() -> dict[str, int]:
+    table = {}
+    for comp, bits in BASE_COMP.items():
+        table[comp] = bits
+        # Same computation on M sets the a-bit
+        if 'A' in comp:
+            table[comp.replace('A', 'M')] = bits | 0b1000000
+    # Commutative operators accept their operands in either order (A+D, 1+D, M&D, ...)
+    for comp, bits in list(table.items()):
+        if len(comp) == 3 and comp[1] in '+&|':
+            table.setdefault(comp[2] + comp[1] + comp[0], bits)
+    return table
+
+def buildDestTable() -> dict[str, int]:
+    table = {'': 0}
+    bits = {'A': 0b100, 'D': 0b010, 'M': 0b001}
+    # Any ordering of any subset of A, D, M (MD, DM, AMD, ADM, ...)
+    for size in range(1, 4):
+        for regs in permutations('ADM', size):
+            table[''.join(regs)] = sum(bits[r] for r in regs)
+    return table
+
+COMP = buildCompTable()
+DEST = buildDestTable()
+
+def buildCInstructionTable() -> dict[str, int]:
+    # Every valid whitespace-free "dest=comp;jump" spelling mapped to its 16-bit instruction word
+    table = {}
+    for dest, d in DEST.items():
+        for comp, c in COMP.items():
+            for jump, j in JUMP.items():
+                line = f"{dest}={comp}" if dest else comp
+                if jump:
+                    line += f";{jump}"
+                table[line] = 0b111 << 13 | c << 6 | d << 3 | j
+    return table
+
+C_CODES = buildCInstructionTable()
+C_INSTRUCTIONS = {line: f"{code:016b}" for line, code in C_CODES.items()}
+
+# Serialize a ROM image as packed little-endian 16-bit words (.hackb)
+def packRom(rom: array) -> bytes:
+    if sys.byteorder == 'big':
+        rom = array('H', rom)
+        rom.byteswap()
+    return rom.tobytes()
+
+# Load a ROM image from either a text .hack file or a packed .hackb file
+def loadRom(filename: str) -> array:
+    rom = array('H')
+    if filename.endswith('.hackb'):
+        with open(filename, 'rb') as f:
+            rom.frombytes(f.read())
+        if sys.byteorder == 'big':
+            rom.byteswap()
+    else:
+        with open(filename, 'r') as f:
+            rom.extend(int(line, 2) for line in f if line.strip())
+    return rom
+
+# Write a ROM image as packed .hackb or, for any other suffix, as text .hack
+def writeRom(filename: str, rom: array):
+    if filename.endswith('.hackb'):
+        with open(filename, 'wb') as f:
+            f.write(packRom(rom))
+    else:
+        with open(filename, 'w') as f:
+            f.write('\n'.join([f"{code:016b}" for code in rom]))
+
+# Write a ROM image next to fileasm, as text .hack or packed .hackb
+def exportRom(fileasm: str, rom: array, packed: bool = False):
+    writeRom(fileasm[:-4] + ('.hackb' if packed else '.hack'), rom)
+
+# Read a .map source map back as (asm line number, instruction, VM command) per ROM address
+def loadSourceMap(filemap: str) -> list[tuple[int, str, str]]:
+    entries = []
+    with open(filemap, 'r') as f:
+        for row in f:
+            _, lineno, line, comment = row.rstrip('\n').split('\t')
+            entries.append((int(lineno), line, comment))
+    return entries
+
+# Assemble asm source text into a ROM image without touching the filesystem
+def assemble(source: str) -> array:
+    return PureAsm().assemble(source)
 
 class PureAsm():
     predefined_symbol_table = {
@@ -24,110 +151,95 @@ class PureAsm():
         'R14': 14,
         'R15': 15,
         'SCREEN': 16384,
-        'KBD': 24567
+        'KBD': 24576
     }
     
     def __init__(self) -> None:
         self.symbolic_content: list[str] = []
         self.bin_content: list[str] = []
-        self.symbol_table = PureAsm.predefined_symbol_table
+        self.symbol_table = dict(PureAsm.predefined_symbol_table)
         self.length = 0
         self.next_mem_loc = 16
     
     def parse(self, filename: str):
+        self.symbolic_content.extend(self.readLines(filename))
+
+    # Yield the cleaned, non-empty lines of the file one at a time
+    def readLines(self, filename: str) -> Iterator[str]:
         with open(filename, 'r') as asm:
-            for line in asm.readlines():
-                line = line.strip()
-                line = self.removeSpace(line)
-                line = self.removeComment(line)
-                if self.isEmpty(line):
-                    continue    
-                self.symbolic_content.append(line)
+            yield from self.cleanLines(asm)
+
+    def cleanLines(self, lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            line = line.strip()
+            line = self.removeSpace(line)
+            line = self.removeComment(line)
+            if self.isEmpty(line):
+                continue    
+            yield line
     
-    def scan_label(self):
+    def scan_label(self, lines: Iterable[str] = None):
         count = 0
-        for line in self.symbolic_content:
-            if match:= re.match(r"^\((.*?)\)$", line):
-                self.symbol_table[f'{match[1]}'] = count
+        for line in self.symbolic_content if lines is None else lines:
+            if line.startswith('(') and line.endswith(')'):
+                self.symbol_table[line[1:-1]] = count
             else:
                 count += 1
     
     def convert2bin(self):
         for line in self.symbolic_content:
-            if line.startswith('@'):
-                command = self.parseAtype(line)
-            elif line.startswith('('):
-                continue
-            else:
-                command = self.parseCtype(line)
-            self.bin_content.append(command)
+            command = self.convertLine(line)
+            if command is not None:
+                self.bin_content.append(command)
+
+    # Binary string of one instruction, None for a label declaration
+    def convertLine(self, line: str) -> str:
+        if line.startswith('@'):
+            return self.parseAtype(line)
+        elif line.startswith('('):
+            return None
+        else:
+            return self.parseCtype(line)
+
+    # Instruction word of one line, None for a label declaration
+    def encodeLine(self, line: str) -> int:
+        if line.startswith('@'):
+            return self.resolveAddress(line[1:])
+        elif line.startswith('('):
+            return None
+        try:
+            return C_CODES[line]
+        except KeyError:
+            raise ValueError(f"Invalid C-instruction: {line}") from None
+
+    def resolveAddress(self, value: str) -> int:
+        if value.isdigit():
+            return int(value)
+        if value not in self.symbol_table:
+            self.symbol_table[value] = self.next_mem_loc
+            self.next_mem_loc += 1
+        return self.symbol_table[value]
 
     def parseAtype(self, line) -> str:
-        if match:= re.match('@(\d+)', line):
-            mem_loc = int(match[1])
-        elif match:= re.match('@(.+)', line):
-            if match[1] not in self.symbol_table:
-                self.symbol_table[match[1]] = self.next_mem_loc
-                self.next_mem_loc += 1
-            mem_loc = self.symbol_table[match[1]]
-        return f"{mem_loc:016b}"
+        return f"{self.resolveAddress(line[1:]):016b}"
     
     def parseCtype(self, line) -> str:
-        field = re.match(r'(?:(?P<dest>[MAD]{0,3})=)?(?P<comp>[01MAD\+\-\&\|\!]+)(?:;(?P<jump>JGT|JEQ|JGE|JLT|JNE|JLE|JMP|))?', line)
-        # print(field['dest'], field['comp'], field['jump'])
+        # Single lookup in the precomputed dest=comp;jump table
+        try:
+            return C_INSTRUCTIONS[line]
+        except KeyError:
+            raise ValueError(f"Invalid C-instruction: {line}") from None
 
-        # Parsing the a value
-        if 'M' in field['comp']:
-            a=1
-            symbol='M'
-        else:
-            a=0
-            symbol='A'
-
-        # Parsing the computation part
-        match field['comp']:
-            case '0': comp='101010'
-            case '1': comp='111111'
-            case '-1': comp='111010'
-            case 'D': comp='001100'
-            case '!D': comp='001101'
-            case '-D': comp='001111'
-            case 'D+1': comp='011111'
-            case 'D-1': comp='001110'
-            case x if x==symbol: comp='110000'
-            case x if x==f'!{symbol}': comp='110001'
-            case x if x==f'-{symbol}': comp='110011'
-            case x if x==f'{symbol}+1': comp='110111'
-            case x if x==f'{symbol}-1': comp='110010'
-            case x if x==f'D+{symbol}': comp='000010'
-            case x if x==f'D-{symbol}': comp='010011'
-            case x if x==f'{symbol}-D': comp='000111'
-            case x if x==f'D&{symbol}': comp='000000'
-            case x if x==f'D|{symbol}': comp='010101'
-
-        # Parsing the destination part
-        d1=0
-        d2=0
-        d3=0
-        if field['dest']:
-            if 'M' in field['dest']:
-                d3=1
-            if 'D' in field['dest']:
-                d2=1
-            if 'A' in field['dest']:
-                d1=1
-                
-        # Parsing the jump part
-        j1=0
-        j2=0
-        j3=0
-        if field['jump'] in ['JGT', 'JMP', 'JGE', 'JNE']:
-            j3 = 1
-        if field['jump'] in ['JEQ', 'JGE', 'JLE', 'JMP']:
-            j2 = 1
-        if field['jump'] in ['JLT', 'JNE', 'JLE', 'JMP']:
-            j1 = 1
-        return f"111{a}{comp}{d1}{d2}{d3}{j1}{j2}{j3}"
+    # Assemble source text straight into a ROM image of 16-bit words
+    def assemble(self, source: str) -> array:
+        self.symbolic_content.extend(self.cleanLines(source.splitlines()))
+        self.scan_label()
+        rom = array('H')
+        for line in self.symbolic_content:
+            code = self.encodeLine(line)
+            if code is not None:
+                rom.append(code)
+        return rom
             
     @staticmethod
     def isEmpty(line: str) -> bool:
@@ -135,11 +247,12 @@ class PureAsm():
     
     @staticmethod
     def removeComment(line: str) -> str:
-        return re.sub(r"//.*", "", line)
+        comment_idx = line.find("//")
+        return line if comment_idx < 0 else line[:comment_idx]
     
     @staticmethod
     def removeSpace(line: str) -> str:
-        return re.sub(r"\s+", "", line)
+        return "".join(line.split())
     
     def show(self):
         print('\n'.join(self.symbolic_content))
@@ -153,7 +266,225 @@ class PureAsm():
         with open(filehack, 'w') as f:
             f.write('\n'.join(self.bin_content))
 
-filenames=['pong.asm', 'add.asm', 'max.asm', 'rect.asm']
-for filename in filenames:
+    # Assemble one module into a relocatable object. Label addresses are module-relative
+    # and listed in relocations; symbols defined elsewhere are left as externs and
+    # VM static variables (Module.N) as statics, both resolved by the linker
+    def assembleObject(self, source: str, module: str) -> dict:
+        self.symbolic_content.extend(self.cleanLines(source.splitlines()))
+        self.scan_label()
+        labels = {symbol: address for symbol, address in self.symbol_table.items()
+                  if symbol not in PureAsm.predefined_symbol_table}
+        code = []
+        relocations = []
+        externs = []
+        statics = []
+        for line in self.symbolic_content:
+            if line.startswith('('):
+                continue
+            value = line[1:]
+            if not line.startswith('@') or value.isdigit() or value in PureAsm.predefined_symbol_table:
+                code.append(self.encodeLine(line))
+                continue
+            if value in labels:
+                relocations.append(len(code))
+                code.append(labels[value])
+            elif value.rpartition('.')[2].isdigit():
+                statics.append([len(code), value])
+                code.append(0)
+            else:
+                externs.append([len(code), value])
+                code.append(0)
+        return {
+            'module': module,
+            'code': code,
+            'labels': labels,
+            'relocations': relocations,
+            'externs': externs,
+            'statics': statics,
+        }
+
+    # Write the ROM image as packed little-endian words to a .hackb file
+    def export2packed(self, fileasm: str):
+        with open(fileasm, 'r') as asm:
+            rom = self.assemble(asm.read())
+        exportRom(fileasm, rom, packed=True)
+
+    # Cleaned lines with their 1-based source line number and the text of the latest
+    # whole-line comment, which for VMTranslator output is the VM command being expanded
+    def readAnnotated(self, filename: str) -> Iterator[tuple[str, int, str]]:
+        comment = ''
+        with open(filename, 'r') as asm:
+            for lineno, raw in enumerate(asm, 1):
+                raw = raw.strip()
+                line = self.removeComment(self.removeSpace(raw))
+                if self.isEmpty(line):
+                    if raw.startswith('//'):
+                        comment = raw[2:].strip()
+                    continue
+                yield line, lineno, comment
+
+    # Write a human-readable .lst listing and a tab-separated .map source map
+    # (address, asm line number, instruction, VM command) next to fileasm
+    def export2listing(self, fileasm: str):
+        self.scan_label(line for line, _, _ in self.readAnnotated(fileasm))
+        with open(fileasm[:-4] + '.lst', 'w') as lst, open(fileasm[:-4] + '.map', 'w') as srcmap:
+            address = 0
+            for line, lineno, comment in self.readAnnotated(fileasm):
+                code = self.encodeLine(line)
+                if code is None:
+                    lst.write(f"{'':>5}  {'':16}  {lineno:>6}  {line}\n")
+                    continue
+                lst.write(f"{address:>5}  {code:016b}  {lineno:>6}    {line:<16}  // {comment}\n")
+                srcmap.write(f"{address}\t{lineno}\t{line}\t{comment}\n")
+                address += 1
+
+    # Two-pass assembly that never holds the program in memory:
+    # the first pass only records label addresses, the second re-reads the source
+    # and writes the .hack (or packed .hackb) file in chunks of chunk_size instructions
+    def stream2bin(self, fileasm: str, chunk_size: int = 4096, packed: bool = False):
+        self.scan_label(self.readLines(fileasm))
+        if packed:
+            with open(fileasm[:-4] + '.hackb', 'wb') as f:
+                chunk = array('H')
+                for line in self.readLines(fileasm):
+                    code = self.encodeLine(line)
+                    if code is None:
+                        continue
+                    chunk.append(code)
+                    if len(chunk) == chunk_size:
+                        f.write(packRom(chunk))
+                        chunk = array('H')
+                f.write(packRom(chunk))
+            return
+        filehack = fileasm[:-4] + '.hack'
+        with open(filehack, 'w') as f:
+            chunk = []
+            separator = ''
+            for line in self.readLines(fileasm):
+                command = self.convertLine(line)
+                if command is None:
+                    continue
+                chunk.append(command)
+                if len(chunk) == chunk_size:
+                    f.write(separator + '\n'.join(chunk))
+                    separator = '\n'
+                    chunk.clear()
+            if chunk:
+                f.write(separator + '\n'.join(chunk))
+
+class AsmCache():
+    # Bump whenever the encoder output changes so stale ROM images are never reused
+    version = b'hack-asm-1'
+
+    # ROM images keyed by the SHA-256 of their source, evicted least recently used first
+    # once the directory grows past max_bytes
+    def __init__(self, directory: str = '.asmcache', max_bytes: int = 64 << 20) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source: bytes) -> str:
+        return hashlib.sha256(AsmCache.version + source).hexdigest()
+
+    def get(self, key: str) -> array:
+        path = self.directory / f"{key}.hackb"
+        try:
+            rom = loadRom(str(path))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # Refresh the modification time, which is the LRU order. Another worker may
+        # have evicted the entry since it was read; it is still a hit.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return rom
+
+    def put(self, key: str, rom: array):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{key}.hackb"
+        # Write then rename so concurrent readers never see a partial entry
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_bytes(packRom(rom))
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for path in self.directory.glob('*.hackb'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def stats(self) -> str:
+        return f"cache: {self.hits} hits, {self.misses} misses"
+
+# Assemble one file with its own PureAsm and return the wall time it took,
+# plus whether the ROM came from the cache (None when no cache is used)
+def assembleFile(filename: str, stream: bool = False, packed: bool = False, cache: AsmCache = None, listing: bool = False) -> tuple[str, float, bool]:
+    start = time.perf_counter()
+    if listing:
+        PureAsm().export2listing(filename)
     asm = PureAsm()
-    asm.export2bin(filename)
+    hit = None
+    # Streaming mode never loads the whole source, so it always bypasses the cache
+    if cache is not None and not stream:
+        with open(filename, 'rb') as f:
+            source = f.read()
+        key = cache.key(source)
+        rom = cache.get(key)
+        hit = rom is not None
+        if not hit:
+            rom = asm.assemble(source.decode())
+            cache.put(key, rom)
+        exportRom(filename, rom, packed)
+    elif stream:
+        asm.stream2bin(filename, packed=packed)
+    elif packed:
+        asm.export2packed(filename)
+    else:
+        asm.export2bin(filename)
+    return filename, time.perf_counter() - start, hit
+
+# Assemble many files in a process pool, returning per-file results in input order
+def assembleBatch(filenames: list[str], jobs: int = None, stream: bool = False, packed: bool = False, cache: AsmCache = None, listing: bool = False) -> list[tuple[str, float, bool]]:
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(assembleFile, filename, stream, packed, cache, listing) for filename in filenames]
+        return [future.result() for future in futures]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hack assembler")
+    parser.add_argument("files", nargs="+", help=".asm files to assemble")
+    parser.add_argument("--stream", action="store_true", help="two-pass streaming mode with bounded memory")
+    parser.add_argument("--packed", action="store_true", help="write packed little-endian .hackb instead of text .hack")
+    parser.add_argument("-j", "--jobs", type=int, help="assemble the files in a pool of JOBS processes and report timings")
+    parser.add_argument("--cache-dir", default=".asmcache", help="directory of cached ROM images")
+    parser.add_argument("--cache-size", type=int, default=64, help="cache size limit in MB")
+    parser.add_argument("--no-cache", action="store_true", help="always assemble, bypassing the cache")
+    parser.add_argument("--listing", action="store_true", help="also write a .lst listing and a .map source map")
+    args = parser.parse_args()
+    cache = None if args.no_cache else AsmCache(args.cache_dir, args.cache_size << 20)
+    start = time.perf_counter()
+    if args.jobs:
+        results = assembleBatch(args.files, args.jobs, args.stream, args.packed, cache, args.listing)
+        for filename, seconds, _ in results:
+            print(f"{filename}: {seconds*1000:.1f} ms")
+        print(f"{len(results)} files in {(time.perf_counter() - start)*1000:.1f} ms")
+    else:
+        results = [assembleFile(filename, args.stream, args.packed, cache, args.listing) for filename in args.files]
+    if cache is not None:
+        # Workers keep their own counters, so tally from the per-file results
+        cache.hits = sum(1 for *_, hit in results if hit)
+        cache.misses = sum(1 for *_, hit in results if hit is False)
+        print(cache.stats())
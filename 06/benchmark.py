@@ -0,0 +1,127 @@
+from pathlib import Path
+import re
+import sys
+import time
+
+from assembler import PureAsm
+from blockcompiler import BlockEmulator
+from emulator import CPUEmulator, decode
+
+class RegexAsm(PureAsm):
+    # Original regex + match/case encoder, kept only as the baseline to compare against
+
+    def scan_label(self):
+        count = 0
+        for line in self.symbolic_content:
+            if match:= re.match(r"^\((.*?)\)$", line):
+                self.symbol_table[f'{match[1]}'] = count
+            else:
+                count += 1
+
+    def parseAtype(self, line) -> str:
+        if match:= re.match(r'@(\d+)', line):
+            mem_loc = int(match[1])
+        elif match:= re.match(r'@(.+)', line):
+            if match[1] not in self.symbol_table:
+                self.symbol_table[match[1]] = self.next_mem_loc
+                self.next_mem_loc += 1
+            mem_loc = self.symbol_table[match[1]]
+        return f"{mem_loc:016b}"
+
+    def parseCtype(self, line) -> str:
+        field = re.match(r'(?:(?P<dest>[MAD]{0,3})=)?(?P<comp>[01MAD\+\-\&\|\!]+)(?:;(?P<jump>JGT|JEQ|JGE|JLT|JNE|JLE|JMP|))?', line)
+        if 'M' in field['comp']:
+            a=1
+            symbol='M'
+        else:
+            a=0
+            symbol='A'
+        match field['comp']:
+            case '0': comp='101010'
+            case '1': comp='111111'
+            case '-1': comp='111010'
+            case 'D': comp='001100'
+            case '!D': comp='001101'
+            case '-D': comp='001111'
+            case 'D+1': comp='011111'
+            case 'D-1': comp='001110'
+            case x if x==symbol: comp='110000'
+            case x if x==f'!{symbol}': comp='110001'
+            case x if x==f'-{symbol}': comp='110011'
+            case x if x==f'{symbol}+1': comp='110111'
+            case x if x==f'{symbol}-1': comp='110010'
+            case x if x==f'D+{symbol}': comp='000010'
+            case x if x==f'D-{symbol}': comp='010011'
+            case x if x==f'{symbol}-D': comp='000111'
+            case x if x==f'D&{symbol}': comp='000000'
+            case x if x==f'D|{symbol}': comp='010101'
+        d1 = d2 = d3 = 0
+        if field['dest']:
+            d3 = int('M' in field['dest'])
+            d2 = int('D' in field['dest'])
+            d1 = int('A' in field['dest'])
+        j1 = int(field['jump'] in ['JLT', 'JNE', 'JLE', 'JMP'])
+        j2 = int(field['jump'] in ['JEQ', 'JGE', 'JLE', 'JMP'])
+        j3 = int(field['jump'] in ['JGT', 'JMP', 'JGE', 'JNE'])
+        return f"111{a}{comp}{d1}{d2}{d3}{j1}{j2}{j3}"
+
+    @staticmethod
+    def removeComment(line: str) -> str:
+        return re.sub(r"//.*", "", line)
+
+    @staticmethod
+    def removeSpace(line: str) -> str:
+        return re.sub(r"\s+", "", line)
+
+def assemble(cls, filename: str) -> list[str]:
+    asm = cls()
+    asm.parse(filename)
+    asm.scan_label()
+    asm.convert2bin()
+    return asm.bin_content
+
+def timeit(cls, filename: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assemble(cls, filename)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchAssembler(filename: str, repeat: int = 5):
+    assert assemble(RegexAsm, filename) == assemble(PureAsm, filename)
+    regex = timeit(RegexAsm, filename, repeat)
+    table = timeit(PureAsm, filename, repeat)
+    print(f"assembler {Path(filename).name}: regex {regex*1000:.1f} ms, table {table*1000:.1f} ms, speedup x{regex/table:.1f}")
+
+def benchEmulator(filename: str, cycles: int = 2_000_000):
+    # Per-cycle decoding in step() against the pre-decoded dispatch loop in run(),
+    # with and without superinstructions
+    stepped = CPUEmulator(filename)
+    start = time.perf_counter()
+    for _ in range(cycles // 10):
+        stepped.step()
+    step_rate = cycles // 10 / (time.perf_counter() - start)
+    plain = CPUEmulator(filename)
+    plain.ops, plain.args = decode(plain.rom, plain.length, fused=False)
+    start = time.perf_counter()
+    plain.run(cycles)
+    plain_rate = cycles / (time.perf_counter() - start)
+    cpu = CPUEmulator(filename)
+    start = time.perf_counter()
+    cpu.run(cycles)
+    run_rate = cycles / (time.perf_counter() - start)
+    assert (plain.ram == cpu.ram).all() and plain.pc == cpu.pc
+    compiled = BlockEmulator(filename)
+    start = time.perf_counter()
+    compiled.run(cycles)
+    block_rate = cycles / (time.perf_counter() - start)
+    assert (compiled.ram == cpu.ram).all() and compiled.pc == cpu.pc
+    print(f"emulator {Path(filename).name}: step {step_rate/1e6:.2f} M instr/s, pre-decoded {plain_rate/1e6:.2f} M instr/s, "
+          f"fused {run_rate/1e6:.2f} M instr/s, compiled blocks {block_rate/1e6:.2f} M instr/s")
+
+if __name__ == "__main__":
+    here = Path(__file__).parent
+    filename = sys.argv[1] if len(sys.argv) > 1 else str(here / "pong" / "Pong.asm")
+    benchAssembler(filename)
+    benchEmulator(str(here / "pong.hack"))
@@ -0,0 +1,246 @@
+from collections import OrderedDict
+import argparse
+import hashlib
+import re
+import sys
+import time
+
+import numpy as np
+
+from disassembler import C_TEXT
+from emulator import ROM_SIZE, CPUEmulator, alu
+
+# Python expression of each computation, on unsigned 16-bit d, a and m
+COMP_EXPR = {
+    '0': '0',
+    '1': '1',
+    '-1': '65535',
+    'D': 'd',
+    'A': 'a',
+    'M': 'mem[a]',
+    '!D': '~d & 65535',
+    '!A': '~a & 65535',
+    '!M': '~mem[a] & 65535',
+    '-D': '-d & 65535',
+    '-A': '-a & 65535',
+    '-M': '-mem[a] & 65535',
+    'D+1': '(d + 1) & 65535',
+    'A+1': '(a + 1) & 65535',
+    'M+1': '(mem[a] + 1) & 65535',
+    'D-1': '(d - 1) & 65535',
+    'A-1': '(a - 1) & 65535',
+    'M-1': '(mem[a] - 1) & 65535',
+    'D+A': '(d + a) & 65535',
+    'D+M': '(d + mem[a]) & 65535',
+    'D-A': '(d - a) & 65535',
+    'D-M': '(d - mem[a]) & 65535',
+    'A-D': '(a - d) & 65535',
+    'M-D': '(mem[a] - d) & 65535',
+    'D&A': 'd & a',
+    'D&M': 'd & mem[a]',
+    'D|A': 'd | a',
+    'D|M': 'd | mem[a]',
+}
+
+# Jump condition on the unsigned ALU output
+JUMP_EXPR = {
+    0b001: '0 < out < 32768',
+    0b010: 'out == 0',
+    0b011: 'out < 32768',
+    0b100: 'out >= 32768',
+    0b101: 'out != 0',
+    0b110: 'out == 0 or out >= 32768',
+    0b111: 'True',
+}
+
+# Compiled blocks shared by every emulator running the same ROM, keyed by its hash.
+# Only the BLOCK_CACHE_ROMS most recently loaded ROMs are kept, so that runs over many
+# ROMs do not grow without bound; an emulator keeps its own blocks after eviction.
+BLOCK_CACHE: OrderedDict[str, dict[int, tuple]] = OrderedDict()
+BLOCK_CACHE_ROMS = 16
+
+def cachedBlocks(key: str) -> dict[int, tuple]:
+    blocks = BLOCK_CACHE.setdefault(key, {})
+    BLOCK_CACHE.move_to_end(key)
+    while len(BLOCK_CACHE) > BLOCK_CACHE_ROMS:
+        BLOCK_CACHE.popitem(last=False)
+    return blocks
+
+def romHash(rom: np.ndarray, length: int) -> str:
+    return hashlib.sha256(rom[:length].tobytes()).hexdigest()
+
+# Addresses loaded by an A-instruction that directly feeds a jump: the static block leaders
+def findLeaders(words: list[int]) -> set[int]:
+    leaders = {0}
+    for address in range(len(words) - 1):
+        word, following = words[address], words[address + 1]
+        if word < 0x8000 and following >= 0x8000 and following & 0b111 and word < len(words):
+            leaders.add(word)
+            leaders.add(address + 2)
+    return leaders
+
+# Python statements for one C-instruction. a_value is the constant A is known to hold
+# (from the preceding A-instruction) or None; returns the lines and, for a jump,
+# the expression of the next pc
+def translateCtype(word: int, address: int, a_value: int) -> tuple[list[str], str]:
+    a = 'a' if a_value is None else str(a_value)
+    # RAM is addressed by the low 15 bits of A; a loaded constant is below 32768 already
+    m = 'mem[a & 32767]' if a_value is None else f"mem[{a_value}]"
+    comp = C_TEXT[word & 0x1FFF].partition('=')[2] or C_TEXT[word & 0x1FFF]
+    comp = comp.partition(';')[0]
+    if comp in COMP_EXPR:
+        expr = re.sub(r'\ba\b', a, COMP_EXPR[comp]).replace(f"mem[{a}]", m)
+    else:
+        y = m if word & 0x1000 else a
+        expr = f"alu(d, {y}, {word >> 6 & 0b111111})"
+    jump = word & 0b111
+    dests = []
+    # M is written through the old A, so it goes before A is reassigned
+    if word & 0b001000:
+        dests.append(m)
+    if word & 0b010000:
+        dests.append("d")
+    if word & 0b100000:
+        dests.append("a")
+    lines = []
+    if jump and a_value is None and word & 0b100000:
+        lines.append("target = a")
+        a = 'target'
+    if jump and jump != 0b111:
+        lines.append(f"out = {expr}")
+        lines.extend(f"{dest} = out" for dest in dests)
+    elif len(dests) == 1:
+        lines.append(f"{dests[0]} = {expr}")
+    elif dests:
+        lines.append(f"out = {expr}")
+        lines.extend(f"{dest} = out" for dest in dests)
+    if not jump:
+        return lines, None
+    if jump == 0b111:
+        return lines, a
+    return lines, f"{a} if {JUMP_EXPR[jump]} else {address + 1}"
+
+# Generate and compile the block starting at pc. A block runs straight until its first
+# jump, the next leader or the end of the program; it returns the next pc, A and D.
+# Constants loaded into A are propagated into the following instruction.
+def compileBlock(words: list[int], leaders: set[int], pc: int) -> tuple:
+    body = []
+    address = pc
+    next_pc = None
+    a_value = None
+    while address < len(words):
+        word = words[address]
+        if address != pc and address in leaders:
+            break
+        address += 1
+        if word < 0x8000:
+            a_value = word
+            continue
+        lines, next_pc = translateCtype(word, address - 1, a_value)
+        body.extend(lines)
+        # A keeps a known constant until a C-instruction assigns it
+        if word & 0b100000:
+            a_value = None
+        if next_pc is not None:
+            break
+    if a_value is not None:
+        body.append(f"a = {a_value}")
+    length = address - pc
+    if next_pc is None:
+        next_pc = str(address)
+    source = f"def block(mem, a, d):\n"
+    source += ''.join(f"    {line}\n" for line in body)
+    source += f"    return {next_pc}, a, d\n"
+    namespace = {'alu': alu}
+    exec(compile(source, f"<block {pc}>", 'exec'), namespace)
+    # Taking the final jump back onto "@target" itself is the halt loop
+    last = address - 1
+    halt_pc = last - 1 if length and words[last] >= 0x8000 and last > 0 and words[last - 1] == last - 1 else None
+    return namespace['block'], length, halt_pc
+
+class BlockEmulator(CPUEmulator):
+
+    # Emulator that runs the ROM as compiled Python basic blocks, falling back to the
+    # interpreter for the last partial block when max_cycles cuts through it
+    def load(self, rom):
+        super().load(rom)
+        self.words = self.rom[:self.length].tolist()
+        self.leaders = findLeaders(self.words)
+        self.blocks = cachedBlocks(romHash(self.rom, self.length))
+
+    def reset(self):
+        super().reset()
+        # Coverage: the start of every block run since the reset, and the addresses run
+        # by the interpreter for cut blocks
+        self.entered = bytearray(ROM_SIZE + 1)
+        self.interpreted = np.zeros(ROM_SIZE, dtype=bool)
+
+    # Bitmap of the ROM addresses executed since the last reset
+    def coverage(self) -> np.ndarray:
+        covered = self.interpreted.copy()
+        for pc in np.flatnonzero(np.frombuffer(self.entered, dtype=np.uint8)):
+            covered[pc:pc + self.blocks[pc][1]] = True
+        return covered
+
+    def run(self, max_cycles: int = None) -> int:
+        if self.halted:
+            return 0
+        blocks = self.blocks
+        entered = self.entered
+        words = self.words
+        leaders = self.leaders
+        length = self.length
+        mem = self.ram.tolist()
+        pc = self.pc
+        a = self.a
+        d = self.d
+        limit = sys.maxsize if max_cycles is None else max_cycles
+        n = 0
+        while pc < length:
+            block = blocks.get(pc)
+            if block is None:
+                block = blocks[pc] = compileBlock(words, leaders, pc)
+            func, size, halt_pc = block
+            if n + size > limit:
+                break
+            entered[pc] = 1
+            pc, a, d = func(mem, a, d)
+            n += size
+            if pc == halt_pc:
+                self.halted = True
+                break
+        else:
+            self.halted = True
+        return self.finishRun(mem, pc, a, d, n, limit)
+
+    # Store the state of a block loop that ran n cycles, then interpret the block cut
+    # by the cycle limit; returns the cycles run in all. Shared with the block loops
+    # of subclasses so that they keep the same coverage.
+    def finishRun(self, mem: list[int], pc: int, a: int, d: int, n: int, limit: int) -> int:
+        self.ram[:] = mem
+        self.pc = pc
+        self.a = a
+        self.d = d
+        self.cycles += n
+        if not self.halted and n < limit:
+            remainder = CPUEmulator.run(self, limit - n)
+            self.interpreted[pc:pc + remainder] = True
+            n += remainder
+        return n
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hack emulator running compiled basic blocks")
+    parser.add_argument("rom", help=".hack or .hackb file")
+    parser.add_argument("-n", "--cycles", type=int, default=5_000_000, help="cycles to run for the benchmark")
+    args = parser.parse_args()
+    results = {}
+    for engine in (CPUEmulator, BlockEmulator):
+        cpu = engine(args.rom)
+        start = time.perf_counter()
+        cycles = cpu.run(args.cycles)
+        elapsed = time.perf_counter() - start
+        results[engine.__name__] = cpu
+        print(f"{engine.__name__}: {cycles} cycles in {elapsed:.3f} s ({cycles / elapsed / 1e6:.2f} M instr/s)")
+    interpreted, compiled = results.values()
+    same = (interpreted.ram == compiled.ram).all() and (interpreted.pc, interpreted.a, interpreted.d) == (compiled.pc, compiled.a, compiled.d)
+    print(f"final state {'matches' if same else 'DIFFERS'}")
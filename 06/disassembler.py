@@ -0,0 +1,77 @@
+from pathlib import Path
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from assembler import COMP, DEST, JUMP, loadRom
+
+# Canonical dest spelling for each d1d2d3 value: the registers in the book's A, M, D order
+DEST_NAMES = {bits: dest for dest, bits in DEST.items() if list(dest) == sorted(dest, key='AMD'.index)}
+JUMP_NAMES = {bits: jump for jump, bits in JUMP.items()}
+
+def buildCText() -> np.ndarray:
+    # Text of every C-instruction, indexed by its low 13 bits (a, comp, dest, jump)
+    comp_names = {}
+    for comp, bits in COMP.items():
+        # COMP lists the canonical spelling of each computation first
+        comp_names.setdefault(bits, comp)
+    text = []
+    for code in range(1 << 13):
+        comp = comp_names.get(code >> 6)
+        if comp is None:
+            text.append(f"// invalid instruction {0b111 << 13 | code:016b}")
+            continue
+        dest = DEST_NAMES[code >> 3 & 0b111]
+        jump = JUMP_NAMES[code & 0b111]
+        line = f"{dest}={comp}" if dest else comp
+        if jump:
+            line += f";{jump}"
+        text.append(line)
+    return np.array(text)
+
+C_TEXT = buildCText()
+C_VALID = ~np.char.startswith(C_TEXT, '//')
+
+# Decode a whole ROM image at once. The A-instruction feeding each jump is replaced by
+# a synthesized label L<address>, declared right before the instruction it points at.
+# Hack assembly can only spell valid instructions, so a ROM holding any other word (an
+# invalid comp field, or bits 13-14 not set in a C-instruction) raises ValueError
+# rather than reassembling to a different program.
+def disassemble(rom) -> list[str]:
+    words = np.asarray(rom, dtype=np.uint16)
+    is_c = words >= 0x8000
+    value = words & 0x7FFF
+    invalid = is_c & (((words & 0x6000) != 0x6000) | ~C_VALID[words & 0x1FFF])
+    if invalid.any():
+        address = int(np.argmax(invalid))
+        raise ValueError(f"Word {int(words[address]):016b} at address {address} is not a Hack instruction "
+                         f"({int(invalid.sum())} such words)")
+    text = np.where(is_c, C_TEXT[words & 0x1FFF], np.char.add('@', value.astype(str)))
+
+    # An A-instruction directly followed by a jumping C-instruction loads a jump target
+    feeds_jump = np.zeros(len(words), dtype=bool)
+    feeds_jump[:-1] = ~is_c[:-1] & is_c[1:] & ((words[1:] & 0b111) != 0)
+    feeds_jump &= value < len(words)
+    labels = np.unique(value[feeds_jump]).astype(np.intp)
+    text = np.where(feeds_jump, np.char.add('@L', value.astype(str)), text)
+
+    label_text = np.char.add(np.char.add('(L', labels.astype(str)), ')')
+    text = np.insert(text.astype(object), labels, label_text.astype(object))
+    return text.tolist()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hack disassembler")
+    parser.add_argument("rom", help=".hack or .hackb file")
+    parser.add_argument("-o", "--output", help="output .asm file (default: stdout)")
+    args = parser.parse_args()
+    rom = loadRom(args.rom)
+    start = time.perf_counter()
+    lines = disassemble(rom)
+    elapsed = time.perf_counter() - start
+    if args.output:
+        Path(args.output).write_text('\n'.join(lines) + '\n')
+        print(f"{len(rom)} words disassembled in {elapsed*1000:.1f} ms")
+    else:
+        sys.stdout.write('\n'.join(lines) + '\n')
@@ -0,0 +1,629 @@
+from pathlib import Path
+import argparse
+import hashlib
+import sys
+import time
+
+import numpy as np
+
+from assembler import C_CODES, PureAsm, loadRom
+
+ROM_SIZE = 32768
+RAM_SIZE = 32768
+SCREEN = 16384
+KBD = 24576
+
+# Hack codes of the keys that are not a printable character
+KEY_CODES = {
+    'none': 0,
+    'space': 32,
+    'newline': 128,
+    'backspace': 129,
+    'left': 130,
+    'up': 131,
+    'right': 132,
+    'down': 133,
+    'home': 134,
+    'end': 135,
+    'pageup': 136,
+    'pagedown': 137,
+    'insert': 138,
+    'delete': 139,
+    'esc': 140,
+    **{f'f{number}': 140 + number for number in range(1, 13)},
+}
+
+# A key is a name from KEY_CODES, a single character or a numeric key code
+def keyCode(key: str) -> int:
+    if key.lower() in KEY_CODES:
+        return KEY_CODES[key.lower()]
+    if len(key) == 1:
+        return ord(key)
+    return int(key)
+
+# Key script: one "cycle key" line per change of the KBD register, which then holds
+# that key until the next change ("none" releases it). '#' starts a comment.
+def readKeyScript(filename: str) -> list[tuple[int, int]]:
+    events = []
+    with open(filename, 'r') as script:
+        for lineno, line in enumerate(script, 1):
+            fields = line.partition('#')[0].split()
+            if not fields:
+                continue
+            if len(fields) != 2:
+                raise ValueError(f"{filename}:{lineno}: expected 'cycle key', got {line.strip()!r}")
+            events.append((int(fields[0]), keyCode(fields[1])))
+    return sorted(events, key=lambda event: event[0])
+
+# Snapshot file: a little-endian header followed by the whole RAM, so that a snapshot
+# is memory-mapped on restore and its RAM copied in one go. rom is the SHA-256 of the
+# program the snapshot was taken with.
+SNAPSHOT = np.dtype([('magic', 'S8'), ('rom', 'S32'), ('cycles', '<u8'), ('pc', '<u4'),
+                     ('a', '<u2'), ('d', '<u2'), ('halted', 'u1'), ('ram', '<u2', RAM_SIZE)])
+SNAPSHOT_MAGIC = b'HACKSNAP'
+SCREEN_ROWS = 256
+SCREEN_COLUMNS = 512
+
+# 0/1 pixel image of screen memory words (a whole screen or whole rows of it).
+# Bit i of a word is pixel i of its 16, so the little-endian bytes unpack LSB first.
+def unpackScreen(words: np.ndarray) -> np.ndarray:
+    pixels = np.unpackbits(words.astype('<u2', copy=False).view(np.uint8), bitorder='little')
+    return pixels.reshape(-1, SCREEN_COLUMNS)
+
+# Hack ALU on 16-bit unsigned values; control holds the zx nx zy ny f no bits
+def alu(x: int, y: int, control: int) -> int:
+    if control & 0b100000:
+        x = 0
+    if control & 0b010000:
+        x = ~x & 0xFFFF
+    if control & 0b001000:
+        y = 0
+    if control & 0b000100:
+        y = ~y & 0xFFFF
+    out = (x + y) & 0xFFFF if control & 0b000010 else x & y
+    if control & 0b000001:
+        out = ~out & 0xFFFF
+    return out
+
+def jumps(out: int, jump: int) -> bool:
+    if out & 0x8000:
+        return bool(jump & 0b100)
+    if out == 0:
+        return bool(jump & 0b010)
+    return bool(jump & 0b001)
+
+# Handler indices of the pre-decoded instruction stream, in the order the dispatch
+# loop tests them (most frequently executed first in compiled Jack programs)
+(LOAD_A, POP_D, A_M, D_M, PUSH_D, M_D, A_MM1, A_AM1, JMP, M_0, M_DPM, D_A, M_MP1, GENERIC,
+ D_MMD, D_JNE, D_JGE, M_NEG1, M_1, M_NOTM, AM_MP1, AM_MM1, CALL, RETURN, HALT) = range(25)
+
+SPECIALIZED = {
+    'D=M': D_M,
+    'M=D': M_D,
+    'A=A-1': A_AM1,
+    'AM=M-1': AM_MM1,
+    'A=M': A_M,
+    'AM=M+1': AM_MP1,
+    'A=M-1': A_MM1,
+    '0;JMP': JMP,
+    'M=D+M': M_DPM,
+    'D=A': D_A,
+    'M=0': M_0,
+    'M=M+1': M_MP1,
+    'D=M-D': D_MMD,
+    'D;JNE': D_JNE,
+    'M=1': M_1,
+    'M=-1': M_NEG1,
+    'M=!M': M_NOTM,
+    'D;JGE': D_JGE,
+}
+HANDLERS = {C_CODES[line]: handler for line, handler in SPECIALIZED.items()}
+
+# Superinstructions: fixed ASMWriter idioms executed by one fused handler, which still
+# adds the cycles of every instruction it stands for. '@*' matches any A-instruction,
+# whose value becomes an operand of the handler.
+
+def pushSegment(register: str) -> list[str]:
+    return [f'@{register}', 'D=M', '@SP', 'AM=M+1', 'M=D']
+
+def popSegment(register: str) -> list[str]:
+    return ['@R13', 'AM=M-1', 'D=M', f'@{register}', 'M=D']
+
+FUSED = {
+    # push D: ASMWriter.writeMemoryAccess
+    PUSH_D: ['@SP', 'AM=M+1', 'A=A-1', 'M=D'],
+    # pop into D: writeIf, writeArithmethicLogical and the pops of writeMemoryAccess
+    POP_D: ['@SP', 'AM=M-1', 'D=M'],
+    # ASMWriter.writeCall: return address, 4 + argument count, callee
+    CALL: ['@*', 'D=A', '@SP', 'A=M', 'M=D'] + pushSegment('LCL') + pushSegment('ARG') + pushSegment('THIS') + pushSegment('THAT')
+          + ['@*', 'D=A', '@SP', 'D=M-D', '@ARG', 'M=D', '@SP', 'MD=M+1', '@LCL', 'M=D', '@*', '0;JMP'],
+    # ASMWriter.writeReturn
+    RETURN: ['@LCL', 'D=M', '@R13', 'M=D', '@5', 'A=D-A', 'D=M', '@R14', 'M=D',
+             '@SP', 'A=M-1', 'D=M', '@ARG', 'A=M', 'M=D', '@ARG', 'D=M', '@SP', 'M=D+1']
+            + popSegment('THAT') + popSegment('THIS') + popSegment('ARG') + popSegment('LCL')
+            + ['@R14', 'A=M', '0;JMP'],
+}
+
+def patternWords(pattern: list[str]) -> list[int]:
+    words = []
+    for line in pattern:
+        if line == '@*':
+            words.append(None)
+        elif line.startswith('@'):
+            value = line[1:]
+            words.append(int(value) if value.isdigit() else PureAsm.predefined_symbol_table[value])
+        else:
+            words.append(C_CODES[line])
+    return words
+
+FUSED_WORDS = {handler: patternWords(pattern) for handler, pattern in FUSED.items()}
+FUSED_LONGEST = max(len(pattern) for pattern in FUSED.values())
+
+# Replace the handler at the start of every occurrence of a fused pattern. The other
+# addresses of the occurrence keep their own handlers, so jumping into the middle of
+# one still works; a fused handler's operand is the tuple of its wildcard values.
+def fuse(ops: list[int], args: list, words: list[int]):
+    for handler, pattern in FUSED_WORDS.items():
+        first = pattern[0]
+        size = len(pattern)
+        for address in range(len(words) - size + 1):
+            if first is not None and words[address] != first:
+                continue
+            operands = []
+            for expected, word in zip(pattern, words[address:address + size]):
+                if expected is None:
+                    if word >= 0x8000:
+                        break
+                    operands.append(word)
+                elif word != expected:
+                    break
+            else:
+                ops[address] = handler
+                if operands:
+                    args[address] = tuple(operands)
+
+# Decode every ROM word once into parallel handler / operand lists. Operands are the
+# loaded value for A-instructions and the raw word for the generic C handler. Every
+# address past the program, up to the largest value of A, decodes to HALT so running
+# off the end or jumping past the ROM stops the machine.
+def decode(rom: np.ndarray, length: int, fused: bool = True) -> tuple[list[int], list]:
+    words = rom[:length].tolist()
+    ops = [LOAD_A if word < 0x8000 else HANDLERS.get(word, GENERIC) for word in words]
+    padding = 0x10000 - length
+    ops += [HALT] * padding
+    args = words + [0] * padding
+    if fused:
+        fuse(ops, args, words)
+    return ops, args
+
+class CPUEmulator():
+
+    # Headless Hack computer: the ROM and the RAM are uint16 NumPy arrays, and the
+    # screen and keyboard are views onto their memory-mapped RAM regions
+    def __init__(self, rom=None) -> None:
+        self.rom = np.zeros(ROM_SIZE, dtype=np.uint16)
+        self.ram = np.zeros(RAM_SIZE, dtype=np.uint16)
+        self.screen = self.ram[SCREEN:KBD]
+        self.keyboard = self.ram[KBD:KBD + 1]
+        self.length = 0
+        self.ops, self.args = decode(self.rom, 0)
+        self.reset()
+        if rom is not None:
+            self.load(rom)
+
+    def reset(self):
+        self.pc = 0
+        self.a = 0
+        self.d = 0
+        self.cycles = 0
+        self.halted = False
+
+    # Load a ROM image (array('H'), list or NumPy array) or a .hack/.hackb file
+    def load(self, rom):
+        if isinstance(rom, (str, Path)):
+            rom = loadRom(str(rom))
+        rom = np.asarray(rom, dtype=np.uint16)
+        if len(rom) > ROM_SIZE:
+            raise ValueError(f"Program of {len(rom)} words does not fit in the {ROM_SIZE} words ROM")
+        self.rom[:] = 0
+        self.rom[:len(rom)] = rom
+        self.length = len(rom)
+        self.ops, self.args = decode(self.rom, self.length)
+        self.reset()
+
+    # The screen as a 256x512 array of pixels, 1 for black
+    def frame(self) -> np.ndarray:
+        return unpackScreen(self.screen)
+
+    # Run max_cycles cycles (or until halted) while replaying a key script: each key
+    # code is written to KBD once the cycle count reaches its cycle
+    def replay(self, events: list[tuple[int, int]], max_cycles: int = None) -> int:
+        end = None if max_cycles is None else self.cycles + max_cycles
+        n = 0
+        for cycle, code in events:
+            if end is not None and cycle > end:
+                break
+            if cycle > self.cycles:
+                n += self.run(cycle - self.cycles)
+                if self.halted:
+                    return n
+            self.keyboard[0] = code
+        return n + self.run(None if end is None else end - self.cycles)
+
+    def romDigest(self) -> bytes:
+        return hashlib.sha256(self.rom[:self.length].tobytes()).digest()
+
+    # Save PC, A, D, the cycle count and RAM, e.g. once the OS has booted
+    def save(self, filename: str):
+        state = np.zeros((), dtype=SNAPSHOT)
+        state['magic'] = SNAPSHOT_MAGIC
+        state['rom'] = self.romDigest()
+        state['cycles'] = self.cycles
+        state['pc'] = self.pc
+        state['a'] = self.a
+        state['d'] = self.d
+        state['halted'] = self.halted
+        state['ram'] = self.ram
+        state.tofile(filename)
+
+    # Resume from a snapshot taken with the ROM currently loaded
+    def restore(self, filename: str):
+        if Path(filename).stat().st_size != SNAPSHOT.itemsize:
+            raise ValueError(f"{filename} is not a Hack snapshot")
+        state = np.memmap(filename, dtype=SNAPSHOT, mode='r', shape=())
+        if state['magic'] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{filename} is not a Hack snapshot")
+        if state['rom'] != self.romDigest():
+            raise ValueError(f"Snapshot {filename} was taken with a different program")
+        self.ram[:] = state['ram']
+        self.pc = int(state['pc'])
+        self.a = int(state['a'])
+        self.d = int(state['d'])
+        self.cycles = int(state['cycles'])
+        self.halted = bool(state['halted'])
+
+    # Execute one instruction, with the same halting as run(): nothing happens once
+    # halted, and a PC past the program halts without taking a cycle
+    def step(self):
+        if self.halted:
+            return
+        if self.pc >= self.length:
+            self.halted = True
+            return
+        instruction = int(self.rom[self.pc])
+        self.cycles += 1
+        if instruction < 0x8000:
+            self.a = instruction
+            self.pc += 1
+            return
+        y = int(self.ram[self.a & 0x7FFF]) if instruction & 0x1000 else self.a
+        out = alu(self.d, y, instruction >> 6 & 0b111111)
+        # M is written through the address held in A before A itself is updated
+        if instruction & 0b001000:
+            self.ram[self.a & 0x7FFF] = out
+        if instruction & 0b010000:
+            self.d = out
+        target = self.a
+        if instruction & 0b100000:
+            self.a = out
+        if instruction & 0b111 and jumps(out, instruction & 0b111):
+            # "(END) @END 0;JMP" style halt loop: jumping back onto "@target" itself
+            if target == self.pc - 1 and target < self.length and self.rom[target] == target:
+                self.halted = True
+            self.pc = target
+        else:
+            self.pc += 1
+
+    # Run until the program halts, falls off the end of the ROM or max_cycles have
+    # been executed; returns the number of cycles run by this call.
+    # Dispatches on the pre-decoded handlers with RAM held in a list for the duration.
+    # Like the hardware, RAM is addressed by the low 15 bits of A.
+    def run(self, max_cycles: int = None) -> int:
+        if self.halted:
+            return 0
+        ops = self.ops
+        args = self.args
+        mem = self.ram.tolist()
+        pc = self.pc
+        a = self.a
+        d = self.d
+        limit = sys.maxsize if max_cycles is None else max_cycles
+        n = 0
+        halted = False
+        # Handler indices are literal constants here: a global lookup per test costs ~30%.
+        # Fused handlers add their extra cycles to extra; since no handler stands for more
+        # than FUSED_LONGEST cycles, each round dispatches few enough to stay within limit.
+        while not halted and n < limit:
+            count = max(1, (limit - n) // FUSED_LONGEST)
+            extra = 0
+            for i in range(count):
+                op = ops[pc]
+                if op == 0:  # LOAD_A
+                    a = args[pc]
+                    pc += 1
+                elif op == 1:  # POP_D
+                    if n + i + extra + 3 > limit:
+                        a = 0
+                        pc += 1
+                        continue
+                    a = mem[0] = (mem[0] - 1) & 0xFFFF
+                    d = mem[a & 0x7FFF]
+                    extra += 2
+                    pc += 3
+                elif op == 2:  # A_M
+                    a = mem[a & 0x7FFF]
+                    pc += 1
+                elif op == 3:  # D_M
+                    d = mem[a & 0x7FFF]
+                    pc += 1
+                elif op == 4:  # PUSH_D
+                    if n + i + extra + 4 > limit:
+                        a = 0
+                        pc += 1
+                        continue
+                    sp = mem[0] = (mem[0] + 1) & 0xFFFF
+                    a = (sp - 1) & 0xFFFF
+                    mem[a & 0x7FFF] = d
+                    extra += 3
+                    pc += 4
+                elif op == 5:  # M_D
+                    mem[a & 0x7FFF] = d
+                    pc += 1
+                elif op == 6:  # A_MM1
+                    a = (mem[a & 0x7FFF] - 1) & 0xFFFF
+                    pc += 1
+                elif op == 7:  # A_AM1
+                    a = (a - 1) & 0xFFFF
+                    pc += 1
+                elif op == 8:  # JMP
+                    if a == pc - 1 and ops[a] == LOAD_A and args[a] == a:
+                        halted = True
+                        pc = a
+                        count = i + 1
+                        break
+                    pc = a
+                elif op == 9:  # M_0
+                    mem[a & 0x7FFF] = 0
+                    pc += 1
+                elif op == 10:  # M_DPM
+                    mem[a & 0x7FFF] = (d + mem[a & 0x7FFF]) & 0xFFFF
+                    pc += 1
+                elif op == 11:  # D_A
+                    d = a
+                    pc += 1
+                elif op == 12:  # M_MP1
+                    mem[a & 0x7FFF] = (mem[a & 0x7FFF] + 1) & 0xFFFF
+                    pc += 1
+                elif op == 13:  # GENERIC
+                    word = args[pc]
+                    out = alu(d, mem[a & 0x7FFF] if word & 0x1000 else a, word >> 6 & 0b111111)
+                    if word & 0b001000:
+                        mem[a & 0x7FFF] = out
+                    if word & 0b010000:
+                        d = out
+                    target = a
+                    if word & 0b100000:
+                        a = out
+                    if word & 0b111 and jumps(out, word & 0b111):
+                        if target == pc - 1 and ops[target] == LOAD_A and args[target] == target:
+                            halted = True
+                            pc = target
+                            count = i + 1
+                            break
+                        pc = target
+                    else:
+                        pc += 1
+                elif op == 14:  # D_MMD
+                    d = (mem[a & 0x7FFF] - d) & 0xFFFF
+                    pc += 1
+                elif op == 15:  # D_JNE
+                    if not d:
+                        pc += 1
+                    elif a == pc - 1 and ops[a] == LOAD_A and args[a] == a:
+                        halted = True
+                        pc = a
+                        count = i + 1
+                        break
+                    else:
+                        pc = a
+                elif op == 16:  # D_JGE
+                    if d >= 0x8000:
+                        pc += 1
+                    elif a == pc - 1 and ops[a] == LOAD_A and args[a] == a:
+                        halted = True
+                        pc = a
+                        count = i + 1
+                        break
+                    else:
+                        pc = a
+                elif op == 17:  # M_NEG1
+                    mem[a & 0x7FFF] = 0xFFFF
+                    pc += 1
+                elif op == 18:  # M_1
+                    mem[a & 0x7FFF] = 1
+                    pc += 1
+                elif op == 19:  # M_NOTM
+                    mem[a & 0x7FFF] = ~mem[a & 0x7FFF] & 0xFFFF
+                    pc += 1
+                elif op == 20:  # AM_MP1
+                    mem[a & 0x7FFF] = (mem[a & 0x7FFF] + 1) & 0xFFFF
+                    a = mem[a & 0x7FFF]
+                    pc += 1
+                elif op == 21:  # AM_MM1
+                    mem[a & 0x7FFF] = (mem[a & 0x7FFF] - 1) & 0xFFFF
+                    a = mem[a & 0x7FFF]
+                    pc += 1
+                elif op == 22:  # CALL
+                    ret, offset, callee = args[pc]
+                    if n + i + extra + 37 > limit:
+                        a = ret
+                        pc += 1
+                        continue
+                    # Same reads and writes, in the same order, as the unrolled sequence
+                    mem[mem[0] & 0x7FFF] = ret
+                    for register in (1, 2, 3, 4):
+                        d = mem[register]
+                        sp = mem[0] = (mem[0] + 1) & 0xFFFF
+                        mem[sp & 0x7FFF] = d
+                    mem[2] = (mem[0] - offset) & 0xFFFF
+                    d = mem[1] = mem[0] = (mem[0] + 1) & 0xFFFF
+                    a = pc = callee
+                    extra += 36
+                elif op == 23:  # RETURN
+                    if n + i + extra + 42 > limit:
+                        a = 1
+                        pc += 1
+                        continue
+                    d = mem[13] = mem[1]
+                    d = mem[14] = mem[(d - 5) & 0x7FFF]
+                    mem[mem[2] & 0x7FFF] = mem[(mem[0] - 1) & 0x7FFF]
+                    mem[0] = (mem[2] + 1) & 0xFFFF
+                    for register in (4, 3, 2, 1):
+                        a = mem[13] = (mem[13] - 1) & 0xFFFF
+                        d = mem[register] = mem[a & 0x7FFF]
+                    a = pc = mem[14]
+                    extra += 41
+                else:  # HALT
+                    halted = True
+                    count = i
+                    break
+            n += count + extra
+        self.ram[:] = mem
+        self.pc = pc
+        self.a = a
+        self.d = d
+        self.halted = halted
+        self.cycles += n
+        return n
+
+class BatchEmulator():
+
+    # Many Hack machines running the same ROM in lock-step. Registers are 1-D arrays
+    # and RAM is an (n, 32K) array; every step executes one instruction on every
+    # machine still running, with masked updates where the machines have diverged.
+    def __init__(self, rom, n: int) -> None:
+        if isinstance(rom, (str, Path)):
+            rom = loadRom(str(rom))
+        rom = np.asarray(rom, dtype=np.uint16)
+        if len(rom) > ROM_SIZE:
+            raise ValueError(f"Program of {len(rom)} words does not fit in the {ROM_SIZE} words ROM")
+        self.length = len(rom)
+        # One extra word so a PC just past the ROM can still be fetched (it halts anyway)
+        self.rom = np.zeros(ROM_SIZE + 1, dtype=np.uint16)
+        self.rom[:self.length] = rom
+        self.n = n
+        self.ram = np.zeros((n, RAM_SIZE), dtype=np.uint16)
+        self.rows = np.arange(n)
+        self.reset()
+
+    def reset(self):
+        self.pc = np.zeros(self.n, dtype=np.int64)
+        self.a = np.zeros(self.n, dtype=np.uint16)
+        self.d = np.zeros(self.n, dtype=np.uint16)
+        self.cycles = np.zeros(self.n, dtype=np.int64)
+        self.halted = np.zeros(self.n, dtype=bool)
+
+    def step(self):
+        self.halted |= self.pc >= self.length
+        running = np.flatnonzero(~self.halted)
+        if len(running) == 0:
+            return
+        words = self.rom[self.pc[running]]
+        classes = np.unique(words)
+        if len(classes) == 1 and len(running) == self.n:
+            # Machines still in lock-step: plain slices, no gathers
+            self.execute(int(classes[0]), slice(None))
+        else:
+            for word in classes:
+                self.execute(int(word), running[words == word])
+        self.cycles[running] += 1
+
+    # Execute one instruction word on the machines selected by sel (slice or index array),
+    # decoding the word once in Python and updating only those machines
+    def execute(self, word: int, sel):
+        pc = self.pc[sel]
+        if word < 0x8000:
+            self.a[sel] = word
+            self.pc[sel] = pc + 1
+            return
+        # A copy: with sel = slice(None) this would be a view, overwritten below when
+        # the instruction writes A before jumping to the old A
+        a = self.a[sel].copy()
+        rows = self.rows[sel]
+        x = self.d[sel]
+        y = self.ram[rows, a & 0x7FFF] if word & 0x1000 else a
+        control = word >> 6 & 0b111111
+        if control & 0b100000:
+            x = np.zeros_like(x)
+        if control & 0b010000:
+            x = ~x
+        if control & 0b001000:
+            y = np.zeros_like(y)
+        if control & 0b000100:
+            y = ~y
+        out = x + y if control & 0b000010 else x & y
+        if control & 0b000001:
+            out = ~out
+        if word & 0b001000:
+            self.ram[rows, a & 0x7FFF] = out
+        if word & 0b010000:
+            self.d[sel] = out
+        if word & 0b100000:
+            self.a[sel] = out
+        jump = word & 0b111
+        if not jump:
+            self.pc[sel] = pc + 1
+            return
+        signed = out.view(np.int16)
+        taken = np.zeros(len(out), dtype=bool)
+        if jump & 0b100:
+            taken |= signed < 0
+        if jump & 0b010:
+            taken |= signed == 0
+        if jump & 0b001:
+            taken |= signed > 0
+        target = a.astype(np.int64)
+        # Halt loop: jumping back onto an "@target" that loads its own address
+        halts = taken & (target == pc - 1) & (self.rom[np.minimum(target, ROM_SIZE)] == target)
+        if halts.any():
+            self.halted[rows[halts]] = True
+        self.pc[sel] = np.where(taken, target, pc + 1)
+
+    # Step until every machine has halted or max_cycles steps have been taken
+    def run(self, max_cycles: int = None) -> int:
+        steps = 0
+        while max_cycles is None or steps < max_cycles:
+            self.halted |= self.pc >= self.length
+            if self.halted.all():
+                break
+            self.step()
+            steps += 1
+        return steps
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless Hack CPU emulator")
+    parser.add_argument("rom", help=".hack or .hackb file")
+    parser.add_argument("-n", "--cycles", type=int, help="stop after this many cycles")
+    parser.add_argument("--set", nargs="*", default=[], metavar="ADDR=VALUE", help="initial RAM values")
+    parser.add_argument("--dump", nargs="*", default=[], metavar="ADDR[:COUNT]", help="RAM words to print at the end")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="start from a saved machine state")
+    parser.add_argument("--save", metavar="SNAPSHOT", help="save the machine state at the end")
+    parser.add_argument("--keys", metavar="SCRIPT", help="key script of 'cycle key' lines to replay into KBD")
+    args = parser.parse_args()
+    cpu = CPUEmulator(args.rom)
+    if args.restore:
+        cpu.restore(args.restore)
+    for assignment in args.set:
+        address, value = assignment.split('=')
+        cpu.ram[int(address)] = int(value) & 0xFFFF
+    start = time.perf_counter()
+    cycles = cpu.replay(readKeyScript(args.keys), args.cycles) if args.keys else cpu.run(args.cycles)
+    elapsed = time.perf_counter() - start
+    print(f"{cycles} cycles in {elapsed:.3f} s ({'halted' if cpu.halted else 'stopped'} at pc={cpu.pc})")
+    if args.save:
+        cpu.save(args.save)
+    for dump in args.dump:
+        address, _, count = dump.partition(':')
+        address = int(address)
+        for offset in range(int(count or 1)):
+            print(f"RAM[{address + offset}] = {np.int16(cpu.ram[address + offset])}")
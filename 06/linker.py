@@ -0,0 +1,101 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import json
+import time
+
+from assembler import PureAsm, writeRom
+
+# Relocatable objects are stored as JSON .hobj files with the fields produced by
+# PureAsm.assembleObject: module, code, labels, relocations, externs, statics
+
+def saveObject(obj: dict, fileobj: str):
+    with open(fileobj, 'w') as f:
+        json.dump(obj, f, separators=(',', ':'))
+
+def loadObject(fileobj: str) -> dict:
+    with open(fileobj, 'r') as f:
+        return json.load(f)
+
+# Assemble fileasm into the .hobj next to it, unless that object is already newer than the source
+def assembleObjectFile(fileasm: str, force: bool = False) -> tuple[str, bool]:
+    source = Path(fileasm)
+    fileobj = source.with_suffix('.hobj')
+    if not force and fileobj.exists() and fileobj.stat().st_mtime >= source.stat().st_mtime:
+        return str(fileobj), False
+    obj = PureAsm().assembleObject(source.read_text(), source.stem)
+    saveObject(obj, fileobj)
+    return str(fileobj), True
+
+class Linker():
+
+    def __init__(self) -> None:
+        self.objects: list[dict] = []
+        self.bases: list[int] = []
+        self.exports: dict[str, int] = {}
+        self.variables: dict[str, int] = {}
+
+    def add(self, obj: dict):
+        self.objects.append(obj)
+
+    # Place the objects in ROM in the order they were added and resolve every reference.
+    # A module's own labels take precedence over other modules' labels; a symbol that is
+    # neither becomes a variable in RAM starting at 16, in order of first reference.
+    def link(self) -> array:
+        self.bases.clear()
+        self.exports.clear()
+        self.variables.clear()
+        ambiguous = set()
+        base = 0
+        for obj in self.objects:
+            self.bases.append(base)
+            for label, offset in obj['labels'].items():
+                if label in self.exports:
+                    ambiguous.add(label)
+                self.exports[label] = base + offset
+            base += len(obj['code'])
+
+        rom = array('H')
+        next_mem_loc = 16
+        for obj, base in zip(self.objects, self.bases):
+            code = array('H', obj['code'])
+            for offset in obj['relocations']:
+                code[offset] += base
+            for offset, symbol in sorted(obj['externs'] + obj['statics']):
+                if symbol in self.exports:
+                    if symbol in ambiguous:
+                        raise ValueError(f"Label {symbol} referenced by {obj['module']} is defined in several modules")
+                    code[offset] = self.exports[symbol]
+                    continue
+                if symbol not in self.variables:
+                    self.variables[symbol] = next_mem_loc
+                    next_mem_loc += 1
+                code[offset] = self.variables[symbol]
+            rom.extend(code)
+        return rom
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hack linker")
+    parser.add_argument("inputs", nargs="+", help=".asm or .hobj modules in ROM order")
+    parser.add_argument("-o", "--output", required=True, help="linked .hack or .hackb file")
+    parser.add_argument("-j", "--jobs", type=int, help="assemble stale modules in a pool of JOBS processes")
+    parser.add_argument("--force", action="store_true", help="reassemble every .asm module")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    sources = [filename for filename in args.inputs if filename.endswith('.asm')]
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        assembled = dict(zip(sources, pool.map(assembleObjectFile, sources, [args.force] * len(sources))))
+    linker = Linker()
+    for filename in args.inputs:
+        fileobj = assembled[filename][0] if filename in assembled else filename
+        linker.add(loadObject(fileobj))
+    rom = linker.link()
+    writeRom(args.output, rom)
+
+    rebuilt = sum(1 for _, fresh in assembled.values() if fresh)
+    print(f"{len(linker.objects)} modules ({rebuilt} assembled), {len(rom)} words ROM, "
+          f"{len(linker.variables)} variables, {(time.perf_counter() - start)*1000:.1f} ms")
+    if len(rom) > 32768:
+        print(f"warning: program exceeds the 32K ROM by {len(rom) - 32768} words")
@@ -0,0 +1,193 @@
+from collections import Counter
+from pathlib import Path
+import argparse
+
+from assembler import PureAsm
+
+# A program is a list of [line, comments]: a cleaned instruction or label declaration
+# and the whole-line comments written just before it. Comments of removed instructions
+# move on to the next surviving line so that VM command annotations are kept.
+
+PUSH_D = ['@SP', 'AM=M+1', 'A=A-1', 'M=D']
+POP_D = ['@SP', 'AM=M-1', 'D=M']
+
+def readProgram(source: str) -> list[list]:
+    program = []
+    comments = []
+    for raw in source.splitlines():
+        raw = raw.strip()
+        line = PureAsm.removeComment(PureAsm.removeSpace(raw))
+        if PureAsm.isEmpty(line):
+            if raw.startswith('//'):
+                comments.append(raw)
+            continue
+        program.append([line, comments])
+        comments = []
+    if comments:
+        program.append(['', comments])
+    return program
+
+def writeProgram(program: list[list]) -> str:
+    lines = []
+    for line, comments in program:
+        lines.extend(comments)
+        if line:
+            lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+def isLabel(line: str) -> bool:
+    return line.startswith('(')
+
+def isAtype(line: str) -> bool:
+    return line.startswith('@')
+
+def writesA(line: str) -> bool:
+    if isAtype(line):
+        return True
+    dest, assigns, _ = line.partition('=')
+    return bool(assigns) and 'A' in dest
+
+def isUnconditionalJump(line: str) -> bool:
+    return line.endswith(';JMP')
+
+def matches(program: list[list], i: int, pattern: list[str]) -> bool:
+    return [line for line, _ in program[i:i + len(pattern)]] == pattern
+
+# Replace program[i:i+count] by the given lines, carrying the comments over
+def replace(out: list[list], program: list[list], i: int, count: int, lines: list[str], carry: list[str]) -> list[str]:
+    comments = carry + [comment for _, group in program[i:i + count] for comment in group]
+    if not lines:
+        return comments
+    out.append([lines[0], comments])
+    out.extend([line, []] for line in lines[1:])
+    return []
+
+def pushPop(program: list[list]) -> tuple[list[list], int]:
+    # Push D immediately followed by pop to D leaves D unchanged and A = RAM[SP].
+    # When the next instruction reloads A the whole sequence disappears.
+    out = []
+    carry = []
+    saved = 0
+    i = 0
+    size = len(PUSH_D) + len(POP_D)
+    while i < len(program):
+        if matches(program, i, PUSH_D + POP_D):
+            following = program[i + size][0] if i + size < len(program) else ''
+            lines = [] if isAtype(following) else ['@SP', 'A=M']
+            carry = replace(out, program, i, size, lines, carry)
+            saved += size - len(lines)
+            i += size
+            continue
+        line, comments = program[i]
+        out.append([line, carry + comments])
+        carry = []
+        i += 1
+    if carry:
+        out.append(['', carry])
+    return out, saved
+
+def redundantLoad(program: list[list]) -> tuple[list[list], int]:
+    # Within straight-line code, drop @X when A already holds X, and drop @X
+    # when the very next instruction loads A again without using it
+    out = []
+    carry = []
+    saved = 0
+    known = None
+    for index, (line, comments) in enumerate(program):
+        following = program[index + 1][0] if index + 1 < len(program) else ''
+        if isAtype(line) and (line == known or isAtype(following)):
+            carry += comments
+            saved += 1
+            continue
+        if isLabel(line):
+            known = None
+        elif isAtype(line):
+            known = line
+        elif writesA(line):
+            known = None
+        out.append([line, carry + comments])
+        carry = []
+    if carry:
+        out.append(['', carry])
+    return out, saved
+
+def deadCode(program: list[list]) -> tuple[list[list], int]:
+    # Instructions between an unconditional jump and the next label can never run
+    out = []
+    carry = []
+    saved = 0
+    reachable = True
+    for line, comments in program:
+        if isLabel(line):
+            reachable = True
+        elif not reachable and line:
+            carry += comments
+            saved += 1
+            continue
+        out.append([line, carry + comments])
+        carry = []
+        if isUnconditionalJump(line):
+            reachable = False
+    if carry:
+        out.append(['', carry])
+    return out, saved
+
+def jumpToNext(program: list[list]) -> tuple[list[list], int]:
+    # @L / 0;JMP directly followed by (L) falls through anyway
+    out = []
+    carry = []
+    saved = 0
+    i = 0
+    while i < len(program):
+        line = program[i][0]
+        if isAtype(line) and i + 2 < len(program) and program[i + 1][0] == '0;JMP' \
+                and program[i + 2][0] == f"({line[1:]})":
+            carry = replace(out, program, i, 2, [], carry)
+            saved += 2
+            i += 2
+            continue
+        out.append([line, carry + program[i][1]])
+        carry = []
+        i += 1
+    if carry:
+        out.append(['', carry])
+    return out, saved
+
+RULES = {
+    'push-pop': pushPop,
+    'redundant-load': redundantLoad,
+    'dead-code': deadCode,
+    'jump-to-next': jumpToNext,
+}
+
+# Apply every rule until none of them changes the program; returns the optimized
+# program and the number of instructions each rule removed
+def optimize(program: list[list]) -> tuple[list[list], Counter]:
+    stats = Counter()
+    changed = True
+    while changed:
+        changed = False
+        for name, rule in RULES.items():
+            program, saved = rule(program)
+            if saved:
+                stats[name] += saved
+                changed = True
+    return program, stats
+
+def optimizeFile(fileasm: str, fileout: str = None) -> Counter:
+    source = Path(fileasm).read_text()
+    program, stats = optimize(readProgram(source))
+    Path(fileout or fileasm).write_text(writeProgram(program))
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peephole optimizer for Hack assembly")
+    parser.add_argument("asm", help=".asm file to optimize")
+    parser.add_argument("-o", "--output", help="optimized .asm file (default: overwrite the input)")
+    args = parser.parse_args()
+    before = sum(1 for line, _ in readProgram(Path(args.asm).read_text()) if line and not isLabel(line))
+    stats = optimizeFile(args.asm, args.output)
+    for name, saved in stats.most_common():
+        print(f"{name}: {saved} instructions")
+    total = sum(stats.values())
+    print(f"{before} -> {before - total} instructions ({total} saved)")
@@ -0,0 +1,160 @@
+from collections import Counter
+from pathlib import Path
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from assembler import PureAsm
+from blockcompiler import BlockEmulator, compileBlock
+from emulator import ROM_SIZE
+
+# Name of the cycles spent before the first function call (bootstrap code)
+TOP = '(top)'
+
+# Entry address of every function declared in a VMTranslator .asm file. ASMWriter.writeFunction
+# emits (module.function); labels inside functions carry a '$' and the comparison helpers
+# and return addresses have no module prefix.
+def functionLabels(fileasm: str) -> dict[int, str]:
+    asm = PureAsm()
+    asm.scan_label(asm.readLines(fileasm))
+    return {address: label for label, address in asm.symbol_table.items()
+            if label not in PureAsm.predefined_symbol_table and '.' in label and '$' not in label}
+
+class ProfilingEmulator(BlockEmulator):
+
+    # Block emulator that counts the executions of every block and follows the VM call
+    # stack. A block starting at a function entry with a new LCL is a call (a goto to a
+    # label sharing the entry address keeps LCL); reaching the return address saved at
+    # LCL-5 by the call returns from it. Cycles are charged to the current stack.
+    def __init__(self, rom=None, functions: dict[int, str] = None) -> None:
+        self.functions = functions or {}
+        super().__init__(rom)
+
+    def reset(self):
+        super().reset()
+        self.block_hits = [0] * (ROM_SIZE + 1)
+        self.partial = Counter()
+        self.stack: list[tuple[str, int, int]] = []
+        self.folded = Counter()
+        self.calls = Counter()
+
+    def run(self, max_cycles: int = None) -> int:
+        if self.halted:
+            return 0
+        blocks = self.blocks
+        words = self.words
+        leaders = self.leaders
+        length = self.length
+        functions = self.functions
+        block_hits = self.block_hits
+        entered = self.entered
+        stack = self.stack
+        folded = self.folded
+        path = ';'.join(name for name, _, _ in stack) or TOP
+        ret = stack[-1][2] if stack else -1
+        mem = self.ram.tolist()
+        pc = self.pc
+        a = self.a
+        d = self.d
+        limit = sys.maxsize if max_cycles is None else max_cycles
+        n = 0
+        mark = 0
+        while pc < length:
+            if pc in functions and (not stack or mem[1] != stack[-1][1]):
+                folded[path] += n - mark
+                mark = n
+                ret = mem[(mem[1] - 5) & 0xFFFF]
+                stack.append((functions[pc], mem[1], ret))
+                self.calls[functions[pc]] += 1
+                path = ';'.join(name for name, _, _ in stack)
+            elif pc == ret:
+                folded[path] += n - mark
+                mark = n
+                stack.pop()
+                ret = stack[-1][2] if stack else -1
+                path = ';'.join(name for name, _, _ in stack) or TOP
+            block = blocks.get(pc)
+            if block is None:
+                block = blocks[pc] = compileBlock(words, leaders, pc)
+            func, size, halt_pc = block
+            if n + size > limit:
+                break
+            block_hits[pc] += 1
+            entered[pc] = 1
+            pc, a, d = func(mem, a, d)
+            n += size
+            if pc == halt_pc:
+                self.halted = True
+                break
+        else:
+            self.halted = True
+        # The cut block runs straight from its start, so the interpreted remainder
+        # covers its first addresses
+        total = self.finishRun(mem, pc, a, d, n, limit)
+        if total > n:
+            self.partial[pc] += total - n
+        n = total
+        folded[path] += n - mark
+        return n
+
+    # Number of times each ROM address was executed
+    def hits(self) -> np.ndarray:
+        hits = np.zeros(ROM_SIZE + 1, dtype=np.int64)
+        for pc in np.flatnonzero(self.block_hits):
+            size = self.blocks[pc][1]
+            hits[pc:pc + size] += self.block_hits[pc]
+        for pc, remainder in self.partial.items():
+            hits[pc:pc + remainder] += 1
+        return hits[:ROM_SIZE]
+
+    # Inclusive and exclusive cycles of every function, from the folded stacks;
+    # a recursive function counts once per stack towards its inclusive cycles
+    def functionCycles(self) -> dict[str, tuple[int, int]]:
+        inclusive = Counter()
+        exclusive = Counter()
+        for path, cycles in self.folded.items():
+            names = path.split(';')
+            exclusive[names[-1]] += cycles
+            for name in set(names):
+                inclusive[name] += cycles
+        return {name: (inclusive[name], exclusive[name]) for name in inclusive}
+
+    def report(self) -> str:
+        total = sum(self.folded.values()) or 1
+        lines = [f"{'inclusive':>12} {'%':>6} {'exclusive':>12} {'%':>6} {'calls':>8}  function"]
+        rows = sorted(self.functionCycles().items(), key=lambda item: (-item[1][1], item[0]))
+        for name, (inclusive, exclusive) in rows:
+            lines.append(f"{inclusive:>12} {inclusive / total:>6.1%} {exclusive:>12} {exclusive / total:>6.1%} "
+                         f"{self.calls[name]:>8}  {name}")
+        return '\n'.join(lines) + '\n'
+
+    # One "caller;callee cycles" line per call stack, the input format of flamegraph.pl
+    def writeFolded(self, filename: str):
+        with open(filename, 'w') as f:
+            for path, cycles in sorted(self.folded.items()):
+                if cycles:
+                    f.write(f"{path} {cycles}\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cycle profiler for VMTranslator programs")
+    parser.add_argument("rom", help=".hack or .hackb file")
+    parser.add_argument("--asm", help="source .asm file with the function labels (default: next to the ROM)")
+    parser.add_argument("-n", "--cycles", type=int, default=5_000_000, help="cycles to profile")
+    parser.add_argument("-o", "--output", help="text report (default: stdout)")
+    parser.add_argument("--folded", help="folded-stack file for flamegraph.pl")
+    args = parser.parse_args()
+    fileasm = args.asm or str(Path(args.rom).with_suffix('.asm'))
+    cpu = ProfilingEmulator(args.rom, functionLabels(fileasm))
+    start = time.perf_counter()
+    cycles = cpu.run(args.cycles)
+    elapsed = time.perf_counter() - start
+    report = cpu.report()
+    if args.output:
+        Path(args.output).write_text(report)
+    else:
+        sys.stdout.write(report)
+    if args.folded:
+        cpu.writeFolded(args.folded)
+    print(f"{cycles} cycles profiled in {elapsed:.3f} s ({'halted' if cpu.halted else 'stopped'} at pc={cpu.pc})")
@@ -0,0 +1,80 @@
+from pathlib import Path
+import argparse
+import sys
+
+import numpy as np
+
+from assembler import PureAsm, loadSourceMap
+from blockcompiler import BlockEmulator
+from emulator import readKeyScript
+from profiler import TOP, functionLabels
+
+# Group the ROM addresses of a .map source map by VM function, given the entry address
+# of every function, and by VM command: each run of addresses annotated with the same
+# command is one command. Returns {function: [(asm line number, command, addresses)]}
+def groupSourceMap(entries: list[tuple[int, str, str]], starts: dict[int, str]) -> dict[str, list[tuple[int, str, list[int]]]]:
+    functions = {TOP: []}
+    commands = functions[TOP]
+    previous = None
+    for address, (lineno, _, comment) in enumerate(entries):
+        if address in starts:
+            commands = functions.setdefault(starts[address], [])
+            previous = None
+        if comment != previous:
+            commands.append((lineno, comment, []))
+            previous = comment
+        commands[-1][2].append(address)
+    return functions
+
+class CoverageReport():
+
+    # Coverage of one run: covered is the bitmap of executed ROM addresses, entries the
+    # source map and functions the entry address of every function
+    def __init__(self, covered: np.ndarray, entries: list[tuple[int, str, str]], functions: dict[int, str]) -> None:
+        self.covered = covered
+        self.functions = groupSourceMap(entries, functions)
+
+    # Covered and total instructions and VM commands of every function
+    def functionCoverage(self) -> dict[str, tuple[int, int, int, int]]:
+        result = {}
+        for name, commands in self.functions.items():
+            if not commands:
+                continue
+            hit = [int(self.covered[addresses].sum()) for _, _, addresses in commands]
+            result[name] = (sum(hit), sum(len(addresses) for _, _, addresses in commands),
+                            sum(1 for count in hit if count), len(commands))
+        return result
+
+    def report(self, uncovered: bool = False) -> str:
+        lines = [f"{'instructions':>15} {'%':>7} {'commands':>11}  function"]
+        coverage = self.functionCoverage()
+        for name, (hit, total, commands_hit, commands) in sorted(coverage.items(), key=lambda item: (item[1][0] / item[1][1], item[0])):
+            lines.append(f"{hit:>7}/{total:<7} {hit / total:>7.1%} {commands_hit:>5}/{commands:<5}  {name}")
+            if uncovered and hit < total:
+                for lineno, command, addresses in self.functions[name]:
+                    if not self.covered[addresses].any():
+                        lines.append(f"{'':>33}  line {lineno}: {command}")
+        hit = sum(value[0] for value in coverage.values())
+        total = sum(value[1] for value in coverage.values())
+        functions_hit = sum(1 for name, value in coverage.items() if value[0] and name != TOP)
+        lines.append(f"total {hit}/{total} instructions ({hit / max(total, 1):.1%}), "
+                     f"{functions_hit}/{len(coverage) - (TOP in coverage)} functions entered")
+        return '\n'.join(lines) + '\n'
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Instruction coverage of a VMTranslator program")
+    parser.add_argument("asm", help=".asm file; its .map source map is written with the listing if missing")
+    parser.add_argument("-n", "--cycles", type=int, default=5_000_000, help="cycles to run")
+    parser.add_argument("--keys", metavar="SCRIPT", help="key script to replay into KBD")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="start from a saved machine state")
+    parser.add_argument("--uncovered", action="store_true", help="list the VM commands never executed")
+    args = parser.parse_args()
+    filemap = str(Path(args.asm).with_suffix('.map'))
+    if not Path(filemap).exists() or Path(filemap).stat().st_mtime < Path(args.asm).stat().st_mtime:
+        PureAsm().export2listing(args.asm)
+    cpu = BlockEmulator(PureAsm().assemble(Path(args.asm).read_text()))
+    if args.restore:
+        cpu.restore(args.restore)
+    cycles = cpu.replay(readKeyScript(args.keys), args.cycles) if args.keys else cpu.run(args.cycles)
+    sys.stdout.write(CoverageReport(cpu.coverage()[:cpu.length], loadSourceMap(filemap), functionLabels(args.asm)).report(args.uncovered))
+    print(f"{cycles} cycles ({'halted' if cpu.halted else 'stopped'} at pc={cpu.pc})")
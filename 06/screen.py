@@ -0,0 +1,79 @@
+import argparse
+import time
+
+import numpy as np
+
+from emulator import CPUEmulator, SCREEN_COLUMNS, SCREEN_ROWS, unpackScreen
+
+# Binary PBM: rows of packed bits, MSB first, 1 for black like the Hack screen
+def writePbm(filename: str, image: np.ndarray):
+    with open(filename, 'wb') as f:
+        f.write(f"P4\n{image.shape[1]} {image.shape[0]}\n".encode())
+        f.write(np.packbits(image, axis=1).tobytes())
+
+# Binary PPM with black and white pixels
+def writePpm(filename: str, image: np.ndarray):
+    rgb = np.repeat((1 - image) * 255, 3).astype(np.uint8)
+    with open(filename, 'wb') as f:
+        f.write(f"P6\n{image.shape[1]} {image.shape[0]}\n255\n".encode())
+        f.write(rgb.tobytes())
+
+def writeFrame(filename: str, image: np.ndarray):
+    if filename.endswith('.ppm'):
+        writePpm(filename, image)
+    else:
+        writePbm(filename, image)
+
+class FrameRecorder():
+
+    # Captures the screen of an emulator into a numbered frame sequence such as
+    # frame%05d.pbm. Between captures only the rows whose screen words changed are
+    # unpacked again; the rest of the image is kept from the previous frame.
+    def __init__(self, cpu: CPUEmulator, pattern: str = None) -> None:
+        self.cpu = cpu
+        self.pattern = pattern
+        self.words = np.zeros(SCREEN_ROWS * SCREEN_COLUMNS // 16, dtype=np.uint16)
+        self.image = np.zeros((SCREEN_ROWS, SCREEN_COLUMNS), dtype=np.uint8)
+        self.count = 0
+        self.rendered = 0
+
+    # Bring the image up to date with the screen and write it as the next frame;
+    # returns the image
+    def capture(self) -> np.ndarray:
+        screen = self.cpu.screen
+        changed = screen != self.words
+        if changed.any():
+            rows = np.flatnonzero(changed.reshape(SCREEN_ROWS, -1).any(axis=1))
+            words = screen.reshape(SCREEN_ROWS, -1)[rows]
+            self.image[rows] = unpackScreen(words)
+            self.words[:] = screen
+            self.rendered += len(rows)
+        if self.pattern:
+            writeFrame(self.pattern % self.count, self.image)
+        self.count += 1
+        return self.image
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a Hack program headless and export its screen")
+    parser.add_argument("rom", help=".hack or .hackb file")
+    parser.add_argument("-o", "--output", default="screen.pbm", help="final frame, .pbm or .ppm")
+    parser.add_argument("-n", "--cycles", type=int, default=5_000_000, help="cycles to run")
+    parser.add_argument("--every", type=int, help="also capture a frame every EVERY cycles")
+    parser.add_argument("--frames", default="frame%05d.pbm", help="file name pattern of the captured frames")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="start from a saved machine state")
+    args = parser.parse_args()
+    cpu = CPUEmulator(args.rom)
+    if args.restore:
+        cpu.restore(args.restore)
+    start = time.perf_counter()
+    if args.every:
+        recorder = FrameRecorder(cpu, args.frames)
+        cycles = 0
+        while cycles < args.cycles and not cpu.halted:
+            cycles += cpu.run(min(args.every, args.cycles - cycles))
+            recorder.capture()
+        print(f"{recorder.count} frames, {recorder.rendered} rows rendered")
+    else:
+        cycles = cpu.run(args.cycles)
+    writeFrame(args.output, cpu.frame())
+    print(f"{cycles} cycles in {time.perf_counter() - start:.3f} s, screen written to {args.output}")
@@ -0,0 +1,298 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import re
+import sys
+import time
+
+from assembler import assemble, loadRom
+from emulator import CPUEmulator
+
+# Interpreter for the CPU emulator subset of the nand2tetris test script language:
+# load, output-file, compare-to, output-list, set, repeat, ticktock, output and echo.
+# The project 05 Computer.hdl scripts run on the CPU emulator too: ROM32K load,
+# tick/tock, the reset pin and the ARegister[]/DRegister[]/PC[]/RAM16K[] chip parts.
+# Output lines are compared with the .cmp file as they are produced, where '*' in
+# the .cmp matches any character.
+
+TOKEN = re.compile(r'"[^"]*"|[{},;]|[^\s{},;]+')
+COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+RAM_VARIABLE = re.compile(r'RAM(16K)?\[(\d+)\]$')
+# Supported commands and the number of arguments they need
+COMMAND_ARGUMENTS = {'load': 1, 'output-file': 1, 'compare-to': 1, 'output-list': 0, 'set': 2,
+                     'ticktock': 0, 'tick': 0, 'tock': 0, 'output': 0, 'echo': 0, 'ROM32K': 2}
+# Computer.hdl parts and the CPU emulator registers they stand for
+CHIP_REGISTERS = {'ARegister[]': 'A', 'ARegister[0]': 'A', 'DRegister[]': 'D', 'DRegister[0]': 'D',
+                  'PC[]': 'PC', 'PC[0]': 'PC'}
+
+def tokenize(source: str) -> list[str]:
+    return TOKEN.findall(COMMENT.sub(' ', source))
+
+# Commands are (words, body) pairs; body is the command list of a repeat block, else None
+def parseCommands(tokens: list[str], pos: int = 0, nested: bool = False) -> tuple[list[tuple], int]:
+    commands = []
+    words = []
+    while pos < len(tokens):
+        token = tokens[pos]
+        pos += 1
+        if token in (',', ';'):
+            if words:
+                commands.append((words, None))
+                words = []
+        elif token == '{':
+            if not words or words[0] != 'repeat' or len(words) != 2:
+                raise ValueError(f"Unsupported block: {' '.join(words)}")
+            body, pos = parseCommands(tokens, pos, nested=True)
+            commands.append((words, body))
+            words = []
+        elif token == '}':
+            if words:
+                commands.append((words, None))
+            return commands, pos
+        else:
+            words.append(token)
+    if nested:
+        raise ValueError("Missing '}'")
+    if words:
+        commands.append((words, None))
+    return commands, pos
+
+# Value of a set command: decimal, or %D, %B or %X prefixed
+def parseValue(text: str) -> int:
+    if text.startswith('%'):
+        base = {'D': 10, 'B': 2, 'X': 16}[text[1].upper()]
+        text = text[2:]
+    else:
+        base = 10
+    return int(text, base) & 0xFFFF
+
+# Column of an output-list: name%FormatPadLeft.Length.PadRight, %B1.16.1 by default
+def parseColumn(spec: str) -> tuple[str, str, int, int, int]:
+    name, _, fmt = spec.partition('%')
+    fmt = fmt or 'B1.16.1'
+    left, length, right = (int(part) for part in fmt[1:].split('.'))
+    return name, fmt[0].upper(), left, length, right
+
+def formatValue(value: int, kind: str, length: int) -> str:
+    if kind == 'B':
+        return f"{value:016b}"[-length:].rjust(length)
+    if kind == 'X':
+        return f"{value:04X}"[-length:].rjust(length)
+    signed = value - 0x10000 if value & 0x8000 else value
+    if kind == 'S':
+        return str(signed).ljust(length)[:length]
+    return str(signed).rjust(length)[-length:]
+
+def matchesCompare(line: str, expected: str) -> bool:
+    return len(line) == len(expected) and all(e == '*' or c == e for c, e in zip(line, expected))
+
+class TestScript():
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.directory = Path(filename).parent
+        self.commands, _ = parseCommands(tokenize(Path(filename).read_text()))
+        self.check(self.commands)
+        self.cpu = CPUEmulator()
+        self.reset = 0
+        self.ticked = False
+        self.columns: list[tuple] = []
+        self.out = None
+        self.compare = None
+        self.lines = 0
+        self.failure = None
+
+    # Reject what this interpreter cannot run before running anything
+    def check(self, commands: list[tuple]):
+        for words, body in commands:
+            if body is not None:
+                self.check(body)
+            elif words[0] not in COMMAND_ARGUMENTS:
+                raise ValueError(f"Unsupported command: {' '.join(words)}")
+            elif len(words) - 1 < COMMAND_ARGUMENTS[words[0]]:
+                raise ValueError(f"Missing argument: {' '.join(words)}")
+            elif words[0] == 'load' and not words[1].endswith(('.asm', '.hack', '.hackb', 'Computer.hdl')):
+                raise ValueError(f"Cannot load {words[1]} in the CPU emulator")
+            elif words[0] == 'ROM32K' and words[1] != 'load':
+                raise ValueError(f"Unsupported command: {' '.join(words)}")
+
+    # Run the script; returns None when every output line matched the .cmp file,
+    # else a description of the first mismatch
+    def run(self) -> str:
+        try:
+            self.execute(self.commands)
+        finally:
+            if self.out:
+                self.out.close()
+            if self.compare:
+                self.compare.close()
+        return self.failure
+
+    def execute(self, commands: list[tuple]):
+        for words, body in commands:
+            if self.failure:
+                return
+            if body is not None:
+                count = int(words[1])
+                if [command for command, _ in body] == [['ticktock']]:
+                    self.cpu.run(count)
+                else:
+                    for _ in range(count):
+                        self.execute(body)
+                continue
+            name, args = words[0], words[1:]
+            if name == 'ticktock':
+                self.cpu.run(1)
+            elif name == 'tick':
+                self.ticked = True
+            elif name == 'tock':
+                self.ticked = False
+                self.clock()
+            elif name == 'set':
+                self.set(args[0], parseValue(args[1]))
+            elif name == 'output':
+                self.output()
+            elif name == 'output-list':
+                self.columns = [parseColumn(spec) for spec in args]
+                self.writeLine('|' + ''.join(self.header(column) + '|' for column in self.columns))
+            elif name == 'load':
+                if args[0].endswith('.hdl'):
+                    continue
+                self.load(self.directory / args[0])
+            elif name == 'ROM32K':
+                self.load(self.directory / args[1])
+            elif name == 'output-file':
+                self.out = open(self.directory / args[0], 'w')
+            elif name == 'compare-to':
+                self.compare = open(self.directory / args[0], 'r')
+
+    def load(self, path: Path):
+        if path.suffix == '.asm':
+            self.cpu.load(assemble(path.read_text()))
+        else:
+            self.cpu.load(loadRom(str(path)))
+
+    # One clock cycle of Computer.hdl. Unlike the CPU emulator the hardware never halts:
+    # halt loops keep looping and the empty ROM past the program reads as @0.
+    # With reset set the instruction still executes, then the PC is cleared.
+    def clock(self):
+        cpu = self.cpu
+        cpu.halted = False
+        if cpu.pc >= cpu.length:
+            cpu.a = 0
+            cpu.pc = (cpu.pc + 1) & 0x7FFF
+            cpu.cycles += 1
+        else:
+            cpu.step()
+        if self.reset:
+            cpu.pc = 0
+
+    # RAM address of a RAM[n] or RAM16K[n] variable, None for any other variable
+    @staticmethod
+    def address(variable: str) -> int:
+        match = RAM_VARIABLE.match(variable)
+        if not match:
+            return None
+        address = int(match.group(2))
+        if address >= (16384 if match.group(1) else 32768):
+            raise ValueError(f"Address out of range: {variable}")
+        return address
+
+    def set(self, variable: str, value: int):
+        cpu = self.cpu
+        address = self.address(variable)
+        variable = CHIP_REGISTERS.get(variable, variable)
+        if address is not None:
+            cpu.ram[address] = value
+        elif variable == 'reset':
+            self.reset = value & 1
+        elif variable == 'A':
+            cpu.a = value
+        elif variable == 'D':
+            cpu.d = value
+        elif variable == 'PC':
+            cpu.pc = value
+            cpu.halted = False
+        else:
+            raise ValueError(f"Unknown variable {variable}")
+
+    def get(self, variable: str) -> int:
+        cpu = self.cpu
+        address = self.address(variable)
+        variable = CHIP_REGISTERS.get(variable, variable)
+        if address is not None:
+            return int(cpu.ram[address])
+        if variable == 'reset':
+            return self.reset
+        if variable not in ('A', 'D', 'PC'):
+            raise ValueError(f"Unknown variable {variable}")
+        return getattr(cpu, variable.lower())
+
+    @staticmethod
+    def header(column: tuple) -> str:
+        name, _, left, length, right = column
+        width = left + length + right
+        name = name[:width]
+        padding = (width - len(name)) // 2
+        return ' ' * padding + name + ' ' * (width - len(name) - padding)
+
+    def output(self):
+        cells = []
+        for name, kind, left, length, right in self.columns:
+            if name == 'time':
+                # Clock cycles, marked '+' between a tick and its tock
+                text = f"{self.cpu.cycles}{'+' if self.ticked else ''}"
+                text = text.ljust(length)[:length] if kind == 'S' else text.rjust(length)[-length:]
+            else:
+                text = formatValue(self.get(name), kind, length)
+            cells.append(' ' * left + text + ' ' * right)
+        self.writeLine('|' + '|'.join(cells) + '|')
+
+    def writeLine(self, line: str):
+        self.lines += 1
+        if self.out:
+            self.out.write(line + '\n')
+        if self.compare:
+            expected = self.compare.readline().rstrip('\r\n')
+            if not matchesCompare(line, expected):
+                self.failure = f"Comparison failure at line {self.lines}: expected {expected!r}, got {line!r}"
+
+# Run one script; returns the file, "passed", "failed" or "skipped", a message and the time taken
+def runScript(filename: str) -> tuple[str, str, str, float]:
+    start = time.perf_counter()
+    try:
+        script = TestScript(filename)
+    except ValueError as error:
+        return filename, 'skipped', str(error), 0.0
+    try:
+        failure = script.run()
+    except (ValueError, IndexError, OSError) as error:
+        # A bad value or a missing file fails this script, not the whole run
+        failure = str(error)
+    return filename, 'failed' if failure else 'passed', failure or '', time.perf_counter() - start
+
+# .tst files under the given paths, without the VM emulator scripts
+def findScripts(paths: list[str]) -> list[str]:
+    scripts = []
+    for path in map(Path, paths):
+        candidates = sorted(path.rglob('*.tst')) if path.is_dir() else [path]
+        scripts.extend(str(script) for script in candidates if not script.stem.endswith('VME'))
+    return scripts
+
+def runScripts(filenames: list[str], jobs: int = None) -> list[tuple[str, str, str, float]]:
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(runScript, filenames))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run CPU emulator test scripts")
+    parser.add_argument("paths", nargs="+", help=".tst files or directories to search")
+    parser.add_argument("-j", "--jobs", type=int, help="run the scripts in a pool of JOBS processes")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    results = runScripts(findScripts(args.paths), args.jobs)
+    for filename, status, message, elapsed in results:
+        print(f"{status.upper():7} {filename} ({elapsed*1000:.1f} ms){': ' + message if message else ''}")
+    counts = {status: sum(1 for result in results if result[1] == status) for status in ('passed', 'failed', 'skipped')}
+    print(f"{counts['passed']} passed, {counts['failed']} failed, {counts['skipped']} skipped "
+          f"in {time.perf_counter() - start:.2f} s")
+    sys.exit(1 if counts['failed'] else 0)
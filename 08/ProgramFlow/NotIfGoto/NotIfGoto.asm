@@ -0,0 +1,67 @@
+// push constant 5 
+@5
+D=A
+@SP
+AM=M+1
+A=A-1
+M=D
+// not; if-goto skip_5 
+@SP
+AM=M-1
+D=M+1
+@skip_5
+D; JNE
+// push constant 111; pop temp 0 
+@111
+D=A
+@5
+M=D
+// label skip_5 
+(skip_5)
+// push constant 0; not; if-goto skip_0 
+@skip_0
+0; JMP
+// push constant 111; pop temp 1 
+@111
+D=A
+@6
+M=D
+// label skip_0 
+(skip_0)
+// push constant 2 
+@2
+D=A
+@SP
+AM=M+1
+A=A-1
+M=D
+// push constant 1 
+@1
+D=A
+@SP
+AM=M+1
+A=A-1
+M=D
+// sub 
+@SP
+AM=M-1
+D=M
+A=A-1
+M=M-D
+// neg 
+@SP
+A=M-1
+M=-M
+// not; if-goto skip_neg1 
+@SP
+AM=M-1
+D=M+1
+@skip_neg1
+D; JNE
+// push constant 111; pop temp 2 
+@111
+D=A
+@7
+M=D
+// label skip_neg1 
+(skip_neg1)
@@ -0,0 +1,15 @@
+// Regression test for the if-not-goto rule of VMTranslator.py -O.
+// File name: projects/08/ProgramFlow/NotIfGoto/NotIfGoto.tst
+
+load NotIfGoto.asm,
+output-file NotIfGoto.out,
+compare-to NotIfGoto.cmp,
+output-list RAM[0]%D1.6.1 RAM[5]%D1.6.1 RAM[6]%D1.6.1 RAM[7]%D1.6.1;
+
+set RAM[0] 256,
+
+repeat 200 {
+  ticktock;
+}
+
+output;
@@ -1,7 +1,7 @@
 from enum import Enum
 from pathlib import PurePath, Path
-from collections import defaultdict
-import sys
+from collections import defaultdict, Counter
+import argparse
 
 class VMCommandType(Enum):
     ARITHMETHIC_LOGICAL_CMD = 1
@@ -12,6 +12,7 @@ class VMCommandType(Enum):
     CALL_CMD = 6
     RETURN_CMD = 7
     FUNCTION_CMD = 8
+    FUSED_CMD = 9
 
 class VMCommand():
     
@@ -46,6 +47,105 @@ class VMCommand():
                 self.mem_seg = args[0]
                 self.position = int(args[1])     
 
+class FusedCommand(VMCommand):
+
+    # Pseudo-command standing for a sequence of VM commands, written by ASMWriter with
+    # its own asm template. The operands are given as keyword arguments.
+    def __init__(self, operation: str, commands: list["VMCommand"], **operands):
+        self.origin = "; ".join(command.origin for command in commands)
+        self.operation = operation
+        self.type = VMCommandType.FUSED_CMD
+        self.__dict__.update(operands)
+
+def isPush(command: "VMCommand", segment: str = None, position: int = None) -> bool:
+    return command.type == VMCommandType.MEMORY_ACCESS_CMD and command.operation == "push" \
+        and segment in (None, command.mem_seg) and position in (None, command.position)
+
+def isPop(command: "VMCommand") -> bool:
+    return command.type == VMCommandType.MEMORY_ACCESS_CMD and command.operation == "pop"
+
+# Rewrite rules over the two last commands, returning their replacement or None
+def rewritePair(first: "VMCommand", second: "VMCommand") -> tuple[str, list["VMCommand"]]:
+    if isPush(first) and isPop(second):
+        if (first.mem_seg, first.position) == (second.mem_seg, second.position):
+            return "push-pop", []
+        # Copy without going through the stack
+        return "move", [FusedCommand("move", [first, second], source=(first.mem_seg, first.position),
+                                     target=(second.mem_seg, second.position))]
+    if (isPush(first, "constant", 0) and second.operation == "not") \
+            or (isPush(first, "constant", 1) and second.operation == "neg"):
+        return "push-true", [FusedCommand("push-true", [first, second])]
+    if first.operation == "push-true" and second.type == VMCommandType.IF_CMD:
+        goto = VMCommand("goto", second.label)
+        goto.origin = f"{first.origin}; {second.origin}"
+        return "always-goto", [goto]
+    if first.operation == "not" and second.type == VMCommandType.IF_CMD:
+        return "if-not-goto", [FusedCommand("if-not-goto", [first, second], label=second.label)]
+    return None
+
+# Peephole pass over the (module, command) list of VMParser.read, applied before the
+# commands reach ASMWriter. A replacement can match again with the command before it.
+# Returns the new list and how many times each rule was applied.
+def optimizeCommands(commands: list[tuple[str, "VMCommand"]]) -> tuple[list[tuple[str, "VMCommand"]], Counter]:
+    out = []
+    stats = Counter()
+    for module, command in commands:
+        out.append((module, command))
+        while len(out) >= 2 and out[-2][0] == out[-1][0]:
+            rewrite = rewritePair(out[-2][1], out[-1][1])
+            if rewrite is None:
+                break
+            rule, replacement = rewrite
+            stats[rule] += 1
+            del out[-2:]
+            out.extend((module, fused) for fused in replacement)
+    return out, stats
+
+# Hack instructions in asm text: the lines that are neither comments nor labels
+def countInstructions(asm: str) -> int:
+    count = 0
+    for line in asm.splitlines():
+        line = line.partition("//")[0].strip()
+        if line and not line.startswith("("):
+            count += 1
+    return count
+
+# Drop the functions that no chain of calls from entry reaches; commands before the
+# first function of a module are kept. Returns the remaining commands and the number
+# of commands removed with each function.
+def eliminateDeadFunctions(commands: list[tuple[str, "VMCommand"]], entry: str = "sys.init") -> tuple[list[tuple[str, "VMCommand"]], dict[str, int]]:
+    bodies = {}
+    owner = []
+    function = None
+    previous = None
+    for module, command in commands:
+        if module != previous:
+            function = None
+            previous = module
+        if command.type == VMCommandType.FUNCTION_CMD:
+            function = command.label
+            bodies.setdefault(function, [])
+        elif function is not None and command.type == VMCommandType.CALL_CMD:
+            bodies[function].append(command.label)
+        owner.append(function)
+    if entry not in bodies:
+        return commands, {}
+    reachable = {entry}
+    pending = [entry]
+    while pending:
+        for callee in bodies.get(pending.pop(), []):
+            if callee not in reachable:
+                reachable.add(callee)
+                pending.append(callee)
+    kept = []
+    removed = Counter()
+    for (module, command), function in zip(commands, owner):
+        if function is None or function in reachable:
+            kept.append((module, command))
+        else:
+            removed[function] += 1
+    return kept, dict(removed)
+
 class VMParser():
     
     def __init__(self, filepath: str):
@@ -93,13 +193,14 @@ class VMParser():
 class ASMWriter():
     unary_operator = ["neg", "not"]
     compare_operator = ["lt", "gt", "eq"]
+    compare_jump = {"lt": "JLT", "gt": "JGT", "eq": "JEQ"}
     simple_segment = {
         "local": "LCL",
         "argument": "ARG",
         "this": "THIS",
         "that": "THAT",
     }
-    def __init__(self, filepath: str, init=False):
+    def __init__(self, filepath: str, init=False, shared=False, cache_top=False, inline_compare=False):
         self.filepath = filepath
         self.module =  PurePath(self.filepath).stem
         self.command = None
@@ -107,6 +208,18 @@ class ASMWriter():
         self.count_compare = 0
         self.currrent_func = ""
         self.call_count = defaultdict(lambda: 0)
+        # Shared frames: calls and returns jump to one CALL_ROUTINE / RETURN_ROUTINE,
+        # written by dump() unless another module of the program defines them
+        self.shared = shared
+        self.shared_used = False
+        self.define_shared = True
+        # Stack-top caching: while top_cached is set the top of the stack is held in D
+        # instead of RAM[SP-1], and SP does not count it
+        self.cache_top = cache_top
+        self.top_cached = False
+        # Inline comparisons: lt/gt/eq branch in place instead of going through the
+        # PUSH_TRUE/PUSH_FALSE helpers, larger but faster
+        self.inline_compare = inline_compare
         if init:
             self.writeInit()
 
@@ -114,6 +227,12 @@ class ASMWriter():
         self.command = command
         self.module = module
         self.addComment(command.origin)
+        if self.cache_top:
+            if self.usesCachedTop(command):
+                self.writeCached()
+                return
+            # Labels, calls, returns and the other commands expect the whole stack in RAM
+            self.flushTop()
         if command.type == VMCommandType.ARITHMETHIC_LOGICAL_CMD:
             self.writeArithmethicLogical()
         elif command.type == VMCommandType.MEMORY_ACCESS_CMD:
@@ -130,16 +249,27 @@ class ASMWriter():
             self.writeCall(command.label, command.argnum)
         elif command.type == VMCommandType.RETURN_CMD:
             self.writeReturn()
+        elif command.type == VMCommandType.FUSED_CMD:
+            self.writeFused()
         
     def dump(self):
-        if self.count_compare > 0:
-            self.writeHelperFunction()
         with open(self.filepath, 'w') as ASMFile:
-            ASMFile.writelines(self.code)
-            self.code.clear()
-            self.count_compare = 0
-            self.currrent_func = ""
-            self.call_count = {}
+            ASMFile.write(self.render())
+
+    # The code written so far followed by the helpers it uses; resets the writer
+    def render(self) -> str:
+        self.flushTop()
+        if self.count_compare > 0 and not self.inline_compare:
+            self.writeHelperFunction()
+        if self.shared_used and self.define_shared:
+            self.writeSharedRoutines()
+        text = ''.join(self.code)
+        self.code.clear()
+        self.count_compare = 0
+        self.currrent_func = ""
+        self.call_count = {}
+        self.shared_used = False
+        return text
 
     def addCode(self, code):
         self.code += code + "\n"
@@ -194,6 +324,9 @@ class ASMWriter():
                 self.addCode("AM=M+1")
 
     def writeCall(self, label: str, argnum:int):
+        if self.shared:
+            self.writeSharedCall(label, argnum)
+            return
         self.addCode(f"@{label}$ret.{self.call_count[label]}")
         self.addCode("D=A")
         self.addCode("@SP")
@@ -244,7 +377,33 @@ class ASMWriter():
         self.call_count[label] += 1
         
 
+    # Call site of a shared frame: R14 = return address, R13 = callee, D = 4 + argnum
+    def writeSharedCall(self, label: str, argnum: int):
+        self.shared_used = True
+        self.addCode(f"@{label}$ret.{self.call_count[label]}")
+        self.addCode("D=A")
+        self.addCode("@R14")
+        self.addCode("M=D")
+        self.addCode(f"@{label}")
+        self.addCode("D=A")
+        self.addCode("@R13")
+        self.addCode("M=D")
+        self.addCode(f"@{4+argnum}")
+        self.addCode("D=A")
+        self.addCode("@CALL_ROUTINE")
+        self.addCode("0; JMP")
+        self.addCode(f"({label}$ret.{self.call_count[label]})")
+        self.call_count[label] += 1
+
     def writeReturn(self):
+        if self.shared:
+            self.shared_used = True
+            self.addCode("@RETURN_ROUTINE")
+            self.addCode("0; JMP")
+        else:
+            self.writeReturnFrame()
+
+    def writeReturnFrame(self):
         # BUG: always save LCL and return before other opearation
         # In case there are no argument, it wil override  return value by pop value
         # endFrame = LCL
@@ -308,6 +467,9 @@ class ASMWriter():
                 self.addCode("M=-M")
             elif ops == "not":
                 self.addCode("M=!M")
+        elif ops in self.compare_operator and self.inline_compare:
+            self.count_compare += 1
+            self.writeInlineCompare(ops, self.count_compare)
         elif ops in self.compare_operator:
             self.count_compare += 1
             # Save the specific end label 
@@ -353,6 +515,65 @@ class ASMWriter():
             elif ops == "or":
                 self.addCode("M=D|M")
                 
+    # x op y for the two top most values x, y. The helper compares the sign of x - y,
+    # which overflows when x and y have different signs and a large magnitude
+    # (32767 > -1 gives 32767 + 1 = -32768); here the subtraction is only done for
+    # operands of the same sign, otherwise the sign of x decides. Once popped, y is
+    # kept in R13: 06/peephole.py drops the write of a pushed value that is popped
+    # right away, so RAM[SP] is not read again.
+    def writeInlineCompare(self, ops: str, count: int):
+        self.addCode("@SP")
+        self.addCode("AM=M-1")
+        self.addCode("D=M")
+        if ops == "eq":
+            self.addCode("A=A-1")
+            self.addCode("D=M-D")
+            self.writeCompareResult(ops, count)
+            self.code += f"(END_CMP_{count})\n"
+            return
+        self.addCode("@R13")
+        self.addCode("M=D")
+        # Both non-negative in the common case
+        self.addCode("@SP")
+        self.addCode("A=M-1")
+        self.addCode("D=D|M")
+        self.addCode(f"@SAME_SIGN_CMP_{count}")
+        self.addCode("D; JGE")
+        # Both negative
+        self.addCode("@R13")
+        self.addCode("D=M")
+        self.addCode("@SP")
+        self.addCode("A=M-1")
+        self.addCode("D=D&M")
+        self.addCode(f"@SAME_SIGN_CMP_{count}")
+        self.addCode("D; JLT")
+        # Different signs: x | 1 is negative when x < y and positive when x > y
+        self.addCode("@1")
+        self.addCode("D=A")
+        self.addCode("@SP")
+        self.addCode("A=M-1")
+        self.addCode("D=D|M")
+        self.writeCompareResult(ops, count)
+        self.addCode(f"@END_CMP_{count}")
+        self.addCode("0; JMP")
+        self.code += f"(SAME_SIGN_CMP_{count})\n"
+        self.addCode("@R13")
+        self.addCode("D=M")
+        self.addCode("@SP")
+        self.addCode("A=M-1")
+        self.addCode("D=M-D")
+        self.writeCompareResult(ops, count)
+        self.code += f"(END_CMP_{count})\n"
+
+    # Replace x, addressed by A, with the result of testing D
+    def writeCompareResult(self, ops: str, count: int):
+        self.addCode("M=-1")
+        self.addCode(f"@END_CMP_{count}")
+        self.addCode(f"D; {self.compare_jump[ops]}")
+        self.addCode("@SP")
+        self.addCode("A=M-1")
+        self.addCode("M=0")
+
     def writeHelperFunction(self):
         self.addCode("@END_PROG")
         self.addCode("0; JMP")
@@ -372,6 +593,203 @@ class ASMWriter():
         self.addCode("0; JMP")
         self.addCode("(END_PROG)")
 
+    def writeSharedRoutines(self):
+        self.addCode("@END_FRAME_ROUTINES")
+        self.addCode("0; JMP")
+        # Same frame as writeCall, with the call site values taken from R13-R15
+        self.code += "(CALL_ROUTINE)\n"
+        self.addCode("@R15")
+        self.addCode("M=D")
+        self.addCode("@R14")
+        self.addCode("D=M")
+        self.addCode("@SP")
+        self.addCode("A=M")
+        self.addCode("M=D")
+        for segment in ("LCL", "ARG", "THIS", "THAT"):
+            self.addCode(f"@{segment}")
+            self.addCode("D=M")
+            self.addCode("@SP")
+            self.addCode("AM=M+1")
+            self.addCode("M=D")
+        self.addCode("@R15")
+        self.addCode("D=M")
+        self.addCode("@SP")
+        self.addCode("D=M-D")
+        self.addCode("@ARG")
+        self.addCode("M=D")
+        self.addCode("@SP")
+        self.addCode("MD=M+1")
+        self.addCode("@LCL")
+        self.addCode("M=D")
+        self.addCode("@R13")
+        self.addCode("A=M")
+        self.addCode("0; JMP")
+        self.code += "(RETURN_ROUTINE)\n"
+        self.writeReturnFrame()
+        self.code += "(END_FRAME_ROUTINES)\n"
+
+    def writeFused(self):
+        ops = self.command.operation
+        if ops == "push-true":
+            self.addCode("@SP")
+            self.addCode("AM=M+1")
+            self.addCode("A=A-1")
+            self.addCode("M=-1")
+        elif ops == "if-not-goto":
+            # if-goto jumps when !x != 0, that is x != -1, and not only for x == 0
+            self.addCode("@SP")
+            self.addCode("AM=M-1")
+            self.addCode("D=M+1")
+            if self.currrent_func:
+                self.addCode(f"@{self.currrent_func}${self.command.label}")
+            else:
+                self.addCode(f"@{self.command.label}")
+            self.addCode("D; JNE")
+        elif ops == "move":
+            segment, position = self.command.target
+            if segment in self.simple_segment:
+                # The target address is computed first since loading the value uses D
+                self.addCode(f"@{position}")
+                self.addCode("D=A")
+                self.addCode(f"@{self.simple_segment[segment]}")
+                self.addCode("D=D+M")
+                self.addCode("@R13")
+                self.addCode("M=D")
+                self.writeLoad(*self.command.source)
+                self.addCode("@R13")
+                self.addCode("A=M")
+            else:
+                self.writeLoad(*self.command.source)
+                self.addCode(f"@{self.directAddress(segment, position)}")
+            self.addCode("M=D")
+
+    def usesCachedTop(self, command: "VMCommand") -> bool:
+        if command.type in (VMCommandType.MEMORY_ACCESS_CMD, VMCommandType.IF_CMD):
+            return True
+        if command.type == VMCommandType.ARITHMETHIC_LOGICAL_CMD:
+            return command.operation not in self.compare_operator
+        return command.type == VMCommandType.FUSED_CMD and command.operation in ("push-true", "if-not-goto", "move")
+
+    # Write the cached top of the stack back to RAM
+    def flushTop(self):
+        if self.top_cached:
+            self.addCode("@SP")
+            self.addCode("AM=M+1")
+            self.addCode("A=A-1")
+            self.addCode("M=D")
+            self.top_cached = False
+
+    # Pop the top of the stack into D unless it is already there
+    def loadTop(self):
+        if not self.top_cached:
+            self.addCode("@SP")
+            self.addCode("AM=M-1")
+            self.addCode("D=M")
+        self.top_cached = False
+
+    def writeCached(self):
+        command = self.command
+        ops = command.operation
+        if command.type == VMCommandType.MEMORY_ACCESS_CMD and ops == "push":
+            self.flushTop()
+            self.writeLoad(command.mem_seg, command.position)
+            self.top_cached = True
+        elif command.type == VMCommandType.MEMORY_ACCESS_CMD:
+            self.writeCachedPop(command.mem_seg, command.position)
+        elif ops == "move":
+            # Through D, which is cheaper than the R13 address of the inline move
+            self.flushTop()
+            self.writeLoad(*command.source)
+            self.top_cached = True
+            self.writeCachedPop(*command.target)
+        elif ops == "push-true":
+            self.flushTop()
+            self.addCode("D=-1")
+            self.top_cached = True
+        elif not self.top_cached and ops == "if-goto":
+            self.writeIf(command.label)
+        elif not self.top_cached and ops == "if-not-goto":
+            self.writeFused()
+        elif ops in ("if-goto", "if-not-goto"):
+            self.top_cached = False
+            if ops == "if-not-goto":
+                self.addCode("D=D+1")
+            if self.currrent_func:
+                self.addCode(f"@{self.currrent_func}${command.label}")
+            else:
+                self.addCode(f"@{command.label}")
+            self.addCode("D; JNE")
+        elif ops in self.unary_operator:
+            if self.top_cached:
+                self.addCode("D=-D" if ops == "neg" else "D=!D")
+            else:
+                self.addCode("@SP")
+                self.addCode("AM=M-1")
+                self.addCode("D=-M" if ops == "neg" else "D=!M")
+            self.top_cached = True
+        elif self.top_cached:
+            # The second operand is in D, the first one is the top of the stack in RAM
+            self.addCode("@SP")
+            self.addCode("AM=M-1")
+            self.addCode({"add": "D=D+M", "sub": "D=M-D", "and": "D=D&M", "or": "D=D|M"}[ops])
+        else:
+            self.writeArithmethicLogical()
+
+    def writeCachedPop(self, segment: str, position: int):
+        if segment not in self.simple_segment:
+            self.loadTop()
+            self.addCode(f"@{self.directAddress(segment, position)}")
+            self.addCode("M=D")
+            return
+        # Walking A up to the entry costs one instruction per position, the generic
+        # pop 9 instructions plus the write-back of a cached top
+        walk = max(position, 1) + 2 + (0 if self.top_cached else 3)
+        if walk > 9 + (4 if self.top_cached else 0):
+            # Same as writeMemoryAccess: D = address + value, then address = D - value
+            self.flushTop()
+            self.addCode(f"@{position}")
+            self.addCode("D=A")
+            self.addCode(f"@{self.simple_segment[segment]}")
+            self.addCode("D=D+M")
+            self.addCode("@SP")
+            self.addCode("AM=M-1")
+            self.addCode("D=D+M")
+            self.addCode("A=D-M")
+            self.addCode("M=D-A")
+            return
+        self.loadTop()
+        self.addCode(f"@{self.simple_segment[segment]}")
+        if position == 0:
+            self.addCode("A=M")
+        else:
+            self.addCode("A=M+1")
+            for _ in range(position - 1):
+                self.addCode("A=A+1")
+        self.addCode("M=D")
+
+    # D = value of a segment entry
+    def writeLoad(self, segment: str, position: int):
+        if segment == "constant":
+            self.addCode(f"@{position}")
+            self.addCode("D=A")
+        elif segment in self.simple_segment:
+            self.addCode(f"@{position}")
+            self.addCode("D=A")
+            self.addCode(f"@{self.simple_segment[segment]}")
+            self.addCode("A=D+M")
+            self.addCode("D=M")
+        else:
+            self.addCode(f"@{self.directAddress(segment, position)}")
+            self.addCode("D=M")
+
+    # Symbol or address of a temp, static or pointer entry
+    def directAddress(self, segment: str, position: int) -> str:
+        if segment == "temp":
+            return str(5 + position)
+        if segment == "static":
+            return f"{self.module}.{position}"
+        return "THIS" if position == 0 else "THAT"
+
     def writeMemoryAccess(self, operation):
         if operation == "push":
             if self.command.mem_seg == "constant":
@@ -450,26 +868,89 @@ class ASMWriter():
 
 class VMTranslator():
 
-    def __init__(self, filepath: Path) -> None:
+    def __init__(self, filepath: Path, shared: bool = False, optimize: bool = False, shake: bool = False, cache_top: bool = False,
+                 inline_compare: bool = False) -> None:
         self.filepath_in = filepath
+        self.shared = shared
+        self.cache_top = cache_top
+        self.inline_compare = inline_compare
         if filepath.is_dir():
             self.filepath_out = filepath.joinpath(filepath.name).with_suffix('.asm')
-            self.coder = ASMWriter(self.filepath_out, init=True)
+            self.coder = ASMWriter(self.filepath_out, init=True, shared=shared, cache_top=cache_top,
+                                   inline_compare=inline_compare)
         else:
             self.filepath_out = filepath.with_suffix('.asm')
-            self.coder = ASMWriter(self.filepath_out, init=False)
+            self.coder = ASMWriter(self.filepath_out, init=False, shared=shared, cache_top=cache_top,
+                                   inline_compare=inline_compare)
         self.parser = VMParser(self.filepath_in)
+        self.removed = {}
+        # Only a directory has the bootstrap call to Sys.init that the call graph starts from
+        if shake and filepath.is_dir():
+            self.parser.commands, self.removed = eliminateDeadFunctions(self.parser.commands)
+        self.stats = Counter()
+        if optimize:
+            self.parser.commands, self.stats = optimizeCommands(self.parser.commands)
     
     def convert(self) -> None:
+        with open(self.filepath_out, 'w') as ASMFile:
+            ASMFile.write(self.translate())
+
+    # The whole program as asm text
+    def translate(self) -> str:
         command = self.parser.nextCommand()
         while (command is not None):
             self.coder.write(command[0], command[1])
             command = self.parser.nextCommand()
-        self.coder.dump()
+        return self.coder.render()
+
+    # Write one .asm per .vm module, plus Bootstrap.asm for a directory,
+    # so that each module can be assembled into a relocatable object on its own
+    def convertModules(self) -> list[Path]:
+        outputs = []
+        if self.filepath_in.is_dir():
+            bootstrap = ASMWriter(self.filepath_out.with_name("Bootstrap.asm"), init=True, shared=self.shared)
+            bootstrap.dump()
+            outputs.append(Path(bootstrap.filepath))
+        writers = {}
+        for module, command in self.parser.commands:
+            if module not in writers:
+                writers[module] = ASMWriter(self.filepath_out.with_name(f"{module}.asm"), shared=self.shared, cache_top=self.cache_top,
+                                             inline_compare=self.inline_compare)
+                # The shared routines are linked in from Bootstrap.asm
+                writers[module].define_shared = not self.filepath_in.is_dir()
+            writers[module].write(module, command)
+        for writer in writers.values():
+            writer.dump()
+            outputs.append(Path(writer.filepath))
+        return outputs
 
 if __name__ == "__main__":
-    filepath = sys.argv[1] 
-    translator = VMTranslator(Path(filepath))
-    translator.convert()    
+    parser = argparse.ArgumentParser(description="Hack VM translator")
+    parser.add_argument("path", help=".vm file or directory of .vm files")
+    parser.add_argument("--split", action="store_true", help="write one .asm per module for separate assembly and linking")
+    parser.add_argument("--shared-frames", action="store_true", help="jump to one shared call and return routine instead of inlining them")
+    parser.add_argument("-O", "--optimize", action="store_true", help="fuse common VM command sequences before writing")
+    parser.add_argument("--shake", action="store_true", help="drop the functions not reachable from Sys.init")
+    parser.add_argument("--cache-top", action="store_true", help="keep the top of the stack in D between commands")
+    parser.add_argument("--compare", choices=["helper", "inline"], default="helper",
+                        help="lt/gt/eq through the shared helpers (smaller) or inlined (faster, overflow-safe)")
+    args = parser.parse_args()
+    options = dict(shared=args.shared_frames, optimize=args.optimize, cache_top=args.cache_top,
+                   inline_compare=args.compare == "inline")
+    translator = VMTranslator(Path(args.path), shake=args.shake, **options)
+    for function, count in sorted(translator.removed.items()):
+        print(f"removed {function} ({count} commands)")
+    if translator.removed:
+        # The instructions saved are the difference between the two translations
+        kept = countInstructions(VMTranslator(Path(args.path), shake=True, **options).translate())
+        full = countInstructions(VMTranslator(Path(args.path), **options).translate())
+        print(f"{len(translator.removed)} functions, {sum(translator.removed.values())} commands, "
+              f"{full - kept} instructions removed")
+    for rule, count in translator.stats.most_common():
+        print(f"{rule}: {count}")
+    if args.split:
+        translator.convertModules()
+    else:
+        translator.convert()
 
 